@@ -11,12 +11,52 @@ Version 2 Changes:
 
 import frappe
 import requests
+import itertools
 import json
+import math
 import os
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from requests.auth import AuthBase
+from urllib3.util import Retry
 from .utils import api_response
 
 
+# Number of background jobs a full sync is split into. Each job amortizes its
+# one-time preload (e.g. Company abbreviations) over a large chunk of counties
+COUNTY_SYNC_JOBS = 4
+
+# Tracebacks are attached to the first few per-row sync errors of each batch only
+# (see _log_exc); the counter lives on frappe.local.sync_error_counter
+SYNC_TRACEBACK_LIMIT = 10
+
+# Redis cache keys shared by all sync workers, so each worker doesn't
+# re-authenticate against / re-download from KMHFR
+KMHFR_TOKEN_CACHE_KEY = "kmhfr:token"
+KMHFR_TOKEN_DEFAULT_EXPIRES_IN = 3600  # seconds, used if the OAuth response omits expires_in
+KMHFR_TOKEN_EXPIRY_MARGIN = 30  # seconds; refresh slightly before the token actually expires
+KMHFR_COUNTIES_CACHE_KEY = "kmhfr:counties_raw"
+KMHFR_COUNTIES_CACHE_TTL = 3600  # seconds
+
+# Concurrent sub-county fetches (network-bound, so threads overlap the HTTP latency)
+KMHFR_FETCH_THREADS = 8
+
+# In-process copy of the KMHFR token so repeated calls skip Redis.
+# A worker can serve several sites, so entries are keyed by (site, base_url)
+# and hold (token, expires_at as time.time())
+_TOKEN_CACHE = {}
+
+# Pooled HTTP sessions reused for KMHFR calls (keep-alive, one TLS handshake),
+# one per base_url so each gets its adapter mounted
+_kmhfr_sessions = {}
+_kmhfr_session_lock = threading.Lock()
+
+
 # ============================================================================
 # PUBLIC API - County and Sub-County Sync
 # ============================================================================
@@ -34,29 +74,25 @@ def fix_county_companies_group_flag():
         dict: API response with count of companies updated
     """
     try:
-        # Get all companies that are linked to Healthcare Organizations (county companies)
-        county_companies = frappe.db.sql(
+        # Flag every company linked to a Healthcare Organization (county companies)
+        # as a group company in a single statement
+        frappe.db.sql(
             """
-            SELECT DISTINCT c.name, c.company_name, c.is_group
-            FROM `tabCompany` c
+            UPDATE `tabCompany` c
             INNER JOIN `tabHealthcare Organization` ho ON ho.company = c.name
+            SET c.is_group = 1, c.modified = NOW(), c.modified_by = %s
             WHERE c.is_group = 0 OR c.is_group IS NULL
             """,
-            as_dict=True,
+            (frappe.session.user,),
         )
-
-        updated_count = 0
-        for company in county_companies:
-            frappe.db.set_value("Company", company.name, "is_group", 1)
-            updated_count += 1
-
-            frappe.log_error(
-                title=f"Company Updated - {company.company_name}",
-                message=f"Updated company '{company.name}' to be a group company (is_group=1)",
-            )
+        updated_count = frappe.db.sql("SELECT ROW_COUNT()")[0][0]
 
         frappe.db.commit()
 
+        # Raw UPDATE bypasses set_value's cache invalidation
+        if updated_count:
+            frappe.clear_document_cache("Company")
+
         return api_response(
             success=True,
             message=f"Updated {updated_count} county companies to be group companies",
@@ -99,7 +135,8 @@ def sync_counties_and_subcounties(**kwargs):
             Body: {"county_name": "NAIROBI", "create_subcounties": true}
 
     Args:
-        batch_size (int): Number of counties to process per batch (default: 5)
+        batch_size (int): Number of counties to process per batch
+            (default: counties split evenly across COUNTY_SYNC_JOBS jobs)
         use_api_fallback (bool): If True, force API usage instead of JSON (default: False)
         county_name (str): Optional - specific county to process (e.g., "NAIROBI")
         subcounty_name (str): Optional - specific subcounty to process (e.g., "WESTLANDS")
@@ -110,26 +147,15 @@ def sync_counties_and_subcounties(**kwargs):
     """
     try:
         # Extract parameters from kwargs (works with both GET query params and POST body)
-        batch_size = kwargs.get("batch_size", 5)
+        batch_size = kwargs.get("batch_size", None)
         use_api_fallback = kwargs.get("use_api_fallback", False)
         county_name = kwargs.get("county_name", None)
         subcounty_name = kwargs.get("subcounty_name", None)
         create_subcounties = kwargs.get("create_subcounties", True)
 
-        # DEBUG: Log received parameters
-        frappe.log_error(
-            title="County Sync - Received Parameters",
-            message=f"kwargs={kwargs}\n\n"
-            f"batch_size={batch_size} (type: {type(batch_size)})\n"
-            f"use_api_fallback={use_api_fallback} (type: {type(use_api_fallback)})\n"
-            f"county_name={county_name} (type: {type(county_name)})\n"
-            f"subcounty_name={subcounty_name} (type: {type(subcounty_name)})\n"
-            f"create_subcounties={create_subcounties} (type: {type(create_subcounties)})",
-        )
-
         # Convert batch_size to int if passed as string
         if isinstance(batch_size, str):
-            batch_size = int(batch_size)
+            batch_size = int(batch_size) if batch_size.strip() else None
 
         # Convert use_api_fallback to bool if passed as string
         if isinstance(use_api_fallback, str):
@@ -154,16 +180,6 @@ def sync_counties_and_subcounties(**kwargs):
         else:
             subcounty_name = None
 
-        # DEBUG: Log after conversion
-        frappe.log_error(
-            title="County Sync - After Conversion",
-            message=f"batch_size={batch_size}\n"
-            f"use_api_fallback={use_api_fallback}\n"
-            f"county_name={county_name}\n"
-            f"subcounty_name={subcounty_name}\n"
-            f"create_subcounties={create_subcounties}",
-        )
-
         # Try to load counties from JSON first, fallback to API if needed
         counties, data_source = _load_counties_with_fallback(use_api_fallback)
 
@@ -211,11 +227,16 @@ def _process_all_counties_batch(counties, data_source, batch_size):
     Args:
         counties (list): List of all counties with nested subcounties
         data_source (str): Source of data (JSON or API)
-        batch_size (int): Number of counties per batch
+        batch_size (int): Number of counties per batch, or None to partition
+            evenly into COUNTY_SYNC_JOBS jobs
 
     Returns:
         dict: API response with batch processing details
     """
+    if not batch_size:
+        num_jobs = max(min(len(counties), COUNTY_SYNC_JOBS), 1)
+        batch_size = -(-len(counties) // num_jobs)  # ceil division
+
     # Split into batches
     batches = [
         counties[i : i + batch_size] for i in range(0, len(counties), batch_size)
@@ -325,6 +346,7 @@ def _process_single_subcounty(subcounty_name, county_name, counties, data_source
     Scenario 3 & 4: Process single subcounty (ASYNC at API level, SYNC inside background job)
 
     - API Level: Enqueues background job and returns 202 immediately
+      (or 200 without enqueuing if the county Company and subcounty Region already exist)
     - Background Job: Processes county + subcounty sequentially with synchronous company creation
 
     Args:
@@ -334,7 +356,7 @@ def _process_single_subcounty(subcounty_name, county_name, counties, data_source
         data_source (str): Source of data (JSON or API)
 
     Returns:
-        dict: API response with sync_session_id (202 status)
+        dict: API response with sync_session_id (202 status), or 200 if already synced
     """
     # Find the subcounty and its parent county
     parent_county = None
@@ -368,6 +390,24 @@ def _process_single_subcounty(subcounty_name, county_name, counties, data_source
 
     parent_county_name = parent_county.get("name")
 
+    # Common re-run case: nothing to create, so answer synchronously and skip the enqueue
+    if frappe.db.exists(
+        "Company", {"company_name": parent_county_name}
+    ) and frappe.db.exists(
+        "Healthcare Organization Region", {"region_name": subcounty_name}
+    ):
+        return api_response(
+            success=True,
+            message=f"Subcounty '{subcounty_name}' already exists (Parent: {parent_county_name})",
+            data={
+                "subcounty_name": subcounty_name,
+                "parent_county": parent_county_name,
+                "data_source": data_source,
+                "already_exists": True,
+            },
+            status_code=200,
+        )
+
     # Create a modified county data with only the requested subcounty
     single_subcounty_county_data = {
         "id": parent_county.get("id"),
@@ -421,7 +461,7 @@ def _load_counties_with_fallback(force_api=False):
         tuple: (counties_list, data_source_string)
     """
     if force_api:
-        frappe.log_error(
+        _log_sync_debug(
             title="County Sync - Forced API Mode",
             message="use_api_fallback=True, fetching from KMHFR API instead of JSON",
         )
@@ -430,7 +470,7 @@ def _load_counties_with_fallback(force_api=False):
     try:
         # Try loading from JSON first
         counties = _load_counties_from_json()
-        frappe.log_error(
+        _log_sync_debug(
             title="County Sync - JSON Load Success",
             message=f"Successfully loaded {len(counties)} counties from JSON file",
         )
@@ -494,48 +534,64 @@ def _fetch_counties_from_api():
     Returns:
         list: List of county dictionaries with nested subcounties
     """
-    # Authenticate
-    token = authenticate_kmhfr()
-    if not token:
-        frappe.log_error(
-            title="County Sync - API Fallback Failed",
-            message="Failed to authenticate with KMHFR API",
-        )
-        return []
+    try:
+        # Resolve KMHFR settings once for every call below
+        _load_kmhfr_config()
 
-    # Fetch counties
-    counties_response = _fetch_counties(token)
-    counties = counties_response.get("results", [])
+        # Authenticate
+        token = authenticate_kmhfr()
+        if not token:
+            frappe.log_error(
+                title="County Sync - API Fallback Failed",
+                message="Failed to authenticate with KMHFR API",
+            )
+            return []
+
+        # Fetch counties (raw response shared across workers via Redis)
+        counties_response = frappe.cache().get_value(KMHFR_COUNTIES_CACHE_KEY)
+        if not counties_response:
+            counties_response = _fetch_counties(token)
+            if counties_response.get("results"):
+                frappe.cache().set_value(
+                    KMHFR_COUNTIES_CACHE_KEY,
+                    counties_response,
+                    expires_in_sec=KMHFR_COUNTIES_CACHE_TTL,
+                )
+        counties = counties_response.get("results", [])
 
-    if not counties:
-        frappe.log_error(
-            title="County Sync - API Fallback Failed",
-            message="No counties returned from KMHFR API",
-        )
-        return []
+        if not counties:
+            frappe.log_error(
+                title="County Sync - API Fallback Failed",
+                message="No counties returned from KMHFR API",
+            )
+            return []
 
-    # Fetch subcounties for each county and nest them
-    counties_with_subcounties = []
-    for county in counties:
-        county_id = county.get("id")
-        county_name = county.get("name", "").upper()
-
-        # Fetch subcounties for this county
-        subcounties_response = _fetch_subcounties(county_id, token)
-        subcounties = subcounties_response.get("results", [])
-
-        # Convert subcounty names to uppercase and restructure
-        formatted_subcounties = [
-            {"id": sc.get("id"), "name": sc.get("name", "").upper()}
-            for sc in subcounties
-        ]
-
-        # Add county with nested subcounties
-        counties_with_subcounties.append(
-            {"id": county_id, "name": county_name, "subcounties": formatted_subcounties}
-        )
+        # Fetch subcounties for all counties concurrently, then nest them
+        subcounties_by_county = _prefetch_all_subcounties(counties, token)
+
+        counties_with_subcounties = []
+        for county in counties:
+            county_id = county.get("id")
+            county_name = county.get("name", "").upper()
+
+            subcounties = subcounties_by_county.get(county_id, {}).get("results", [])
+
+            # Convert subcounty names to uppercase and restructure
+            formatted_subcounties = [
+                {"id": sc.get("id"), "name": sc.get("name", "").upper()}
+                for sc in subcounties
+            ]
+
+            # Add county with nested subcounties
+            counties_with_subcounties.append(
+                {"id": county_id, "name": county_name, "subcounties": formatted_subcounties}
+            )
 
-    return counties_with_subcounties
+        return counties_with_subcounties
+
+    finally:
+        # Release pooled KMHFR connections at the end of the fetch
+        _close_kmhfr_session()
 
 
 # ============================================================================
@@ -565,21 +621,29 @@ def _process_county_batch(batch_index, total_batches, counties_batch, sync_sessi
         "subcounties_created": 0,
         "subcounties_skipped": 0,
         "subcounties_failed": 0,
+        "created": [],
         "skipped": [],
         "errors": [],
     }
 
     try:
         # V2: No token needed - subcounties already in county data
-        # Process each county in this batch
-        for county in counties_batch:
-            _process_single_county(county, report)
+        # Normalize/validate the payload once; invalid counties are reported here
+        counties = _normalize_counties(counties_batch, report)
 
-        # Log this batch's report
-        frappe.log_error(
-            title=f"County Sync Batch {batch_index + 1}/{total_batches} - Session {sync_session_id}",
-            message=json.dumps(report, indent=2),
-        )
+        if counties:
+            # One traceback budget per batch
+            _start_sync_error_counter()
+
+            # Load existing records once; counties consult and update these in memory
+            lookups = _preload_sync_lookups()
+
+            # Counties are processed one at a time on this worker's connection: every
+            # county inserts Companies, and ERPNext's nested-set (lft/rgt) updates on
+            # the Company tree lock-wait/deadlock when two open transactions insert
+            # at once. Each county is still committed (or rolled back) as a unit.
+            for county in counties:
+                _process_single_county(county, report, lookups)
 
     except Exception as e:
         frappe.log_error(
@@ -587,29 +651,429 @@ def _process_county_batch(batch_index, total_batches, counties_batch, sync_sessi
             message=f"Batch processing error: {str(e)}\n{frappe.get_traceback()}",
         )
 
+    finally:
+        # Log this batch's report, including counties that succeeded before a failure
+        frappe.log_error(
+            title=f"County Sync Batch {batch_index + 1}/{total_batches} - Session {sync_session_id}",
+            message=json.dumps(report, indent=2),
+        )
+
+
+def _normalize_counties(raw_counties, report):
+    """
+    Validate and normalize a batch payload before the processing loop: county and
+    sub-county names are uppercased, sub-counties without a name are dropped, and
+    counties missing a name or ID are reported as failed and excluded.
+
+    Args:
+        raw_counties (list): County dictionaries with nested subcounties
+        report (dict): Report dictionary to update with invalid counties
+
+    Returns:
+        list: Clean county dictionaries {"id", "name", "subcounties": [{"id", "name"}]}
+    """
+    counties = [
+        {
+            "id": county.get("id"),
+            "name": (county.get("name") or "").strip().upper(),
+            "subcounties": [
+                {"id": subcounty.get("id"), "name": subcounty["name"].strip().upper()}
+                for subcounty in county.get("subcounties") or []
+                if (subcounty.get("name") or "").strip()
+            ],
+        }
+        for county in raw_counties
+    ]
+
+    invalid = [county for county in counties if not county["name"] or not county["id"]]
+    if invalid:
+        report["counties_failed"] += len(invalid)
+        report["errors"].extend(
+            {
+                "type": "County",
+                "name": county["name"] or "Unknown",
+                "error": "Missing county name or ID",
+            }
+            for county in invalid
+        )
+
+    return [county for county in counties if county["name"] and county["id"]]
+
+
+def _preload_sync_lookups():
+    """
+    Load the existing records the sync checks against, in one query per doctype,
+    so per-county/per-region existence checks become in-memory lookups.
+
+    Returns:
+        dict: {
+            "companies": {company_name: {"name", "is_group"}},
+            "abbrs": set of Company abbreviations,
+            "orgs": {organization_name: Healthcare Organization name},
+            "regions": set of Healthcare Organization Region region_names,
+        }
+    """
+    companies = frappe.get_all("Company", fields=["name", "company_name", "abbr", "is_group"])
+
+    return {
+        "companies": {company.company_name: company for company in companies},
+        "abbrs": {company.abbr for company in companies if company.abbr},
+        "orgs": {
+            org.organization_name: org.name
+            for org in frappe.get_all(
+                "Healthcare Organization", fields=["name", "organization_name"]
+            )
+        },
+        "regions": set(
+            frappe.get_all("Healthcare Organization Region", pluck="region_name")
+        ),
+    }
+
+
+def _sync_logger():
+    """File logger (logs/kmhfr_sync.log) for success/diagnostic county sync events"""
+    return frappe.logger("kmhfr_sync", allow_site=True, file_count=5)
+
+
+def _log_exc(title, message):
+    """
+    Log an error from a per-county/per-region except block.
+
+    The formatted traceback is only attached in developer mode or for the first
+    SYNC_TRACEBACK_LIMIT errors of the current sync batch, so a partial outage that
+    fails every row doesn't pay for traceback formatting on each one.
+
+    Args:
+        title (str): Error Log title
+        message (str): Error message (without traceback)
+    """
+    counter = getattr(frappe.local, "sync_error_counter", None) or _start_sync_error_counter()
+    if frappe.conf.get("developer_mode") or next(counter) < SYNC_TRACEBACK_LIMIT:
+        message = f"{message}\n{frappe.get_traceback()}"
+    frappe.log_error(title=title, message=message)
+
+
+def _start_sync_error_counter():
+    """Start a fresh traceback counter for this sync batch/request (see _log_exc)"""
+    frappe.local.sync_error_counter = itertools.count()
+    return frappe.local.sync_error_counter
+
+
+def _log_sync_debug(title, message):
+    """
+    Record a success/diagnostic county sync event in the kmhfr_sync file log.
+    An Error Log entry is also written only when county sync debugging is
+    enabled via the `careverse_debug_county_sync` site config key.
+
+    Args:
+        title (str): Event title
+        message (str): Event message
+    """
+    _sync_logger().info(f"{title}: {message}")
+    if frappe.conf.get("careverse_debug_county_sync"):
+        frappe.log_error(title=title, message=message)
+
 
 # ============================================================================
 # HELPER FUNCTIONS - KMHFR API Integration
 # ============================================================================
 
 
+def _get_kmhfr_session(base_url):
+    """
+    Get the shared requests.Session for a KMHFR base URL, creating it on first use.
+    A pooled HTTPAdapter that retries idempotent GETs on transient gateway errors
+    (with exponential backoff) is mounted on the base URL.
+
+    Args:
+        base_url (str): KMHFR API base URL
+
+    Returns:
+        requests.Session: Shared session for base_url
+    """
+    with _kmhfr_session_lock:
+        session = _kmhfr_sessions.get(base_url)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=32,
+                max_retries=Retry(
+                    total=2,
+                    backoff_factor=0.5,
+                    status_forcelist=[502, 503, 504],
+                    allowed_methods=["GET"],
+                ),
+            )
+            session.mount(base_url, adapter)
+            _kmhfr_sessions[base_url] = session
+
+        return session
+
+
+def _close_kmhfr_session():
+    """Close the shared KMHFR sessions (end of a sync job); the next call opens a new one"""
+    with _kmhfr_session_lock:
+        for session in _kmhfr_sessions.values():
+            session.close()
+        _kmhfr_sessions.clear()
+
+
+@dataclass(frozen=True)
+class _KMHFRConfig:
+    """KMHFR connection settings resolved from HealthPro Backend Settings"""
+
+    base_url: str
+    username: str
+    password: str
+    basic_auth_username: str
+    basic_auth_password: str
+    # OAuth password-grant body, urlencoded once when the settings are loaded
+    token_request_body: bytes
+
+
+def _load_kmhfr_config():
+    """
+    Resolve KMHFR settings (including decrypted passwords) once and stash them on
+    frappe.local for the rest of the request/job.
+
+    Returns:
+        _KMHFRConfig: Resolved settings
+    """
+    settings = frappe.get_single("HealthPro Backend Settings")
+    username = settings.get("kmhfr_auth_username")
+    password = settings.get_password("kmhfr_auth_password", raise_exception=False)
+
+    frappe.local.kmhfr_config = _KMHFRConfig(
+        base_url=settings.get("kmhfr_api_base_url") or "https://api.kmhfr.health.go.ke",
+        username=username,
+        password=password,
+        basic_auth_username=settings.get("kmhfr_basic_auth_username"),
+        basic_auth_password=settings.get_password(
+            "kmhfr_basic_auth_password", raise_exception=False
+        ),
+        token_request_body=urllib.parse.urlencode(
+            {
+                "grant_type": "password",
+                "username": username or "",
+                "password": password or "",
+                "scope": "read",
+            }
+        ).encode(),
+    )
+    return frappe.local.kmhfr_config
+
+
+def _get_kmhfr_config():
+    """
+    Get the KMHFR settings loaded for this request/job, loading them on first use
+    so the helpers stay callable on their own.
+
+    Returns:
+        _KMHFRConfig: Resolved settings
+    """
+    return getattr(frappe.local, "kmhfr_config", None) or _load_kmhfr_config()
+
+
+class KMHFRCircuitOpen(Exception):
+    """Raised instead of calling KMHFR while the circuit breaker is open"""
+
+
+class _KMHFRBreaker:
+    """
+    Minimal circuit breaker for KMHFR calls.
+
+    closed: calls go through. After FAILURE_THRESHOLD consecutive failures
+    (connection errors/timeouts or 5xx) it opens. open: calls fail fast with
+    KMHFRCircuitOpen for COOLDOWN seconds. half_open: one probe call is let
+    through; success closes the breaker, failure re-opens it.
+
+    Used from sub-county fetch threads too, so it must not touch frappe.local.
+    """
+
+    FAILURE_THRESHOLD = 5
+    COOLDOWN = 60  # seconds
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at = 0
+        self.state = "closed"
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "closed":
+                return
+            if (
+                self.state == "open"
+                and time.monotonic() - self.opened_at >= self.COOLDOWN
+            ):
+                self.state = "half_open"
+                return
+            raise KMHFRCircuitOpen("KMHFR API circuit breaker is open")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = "closed"
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.FAILURE_THRESHOLD:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+_kmhfr_breaker = _KMHFRBreaker()
+
+
+def _kmhfr_request(base_url, method, url, **kwargs):
+    """
+    Send a request to KMHFR over the pooled session, guarded by the circuit breaker.
+    Any response below 500 counts as the API being up.
+
+    Args:
+        base_url (str): KMHFR API base URL
+        method (str): HTTP method
+        url (str): Full request URL
+        **kwargs: Passed through to requests.Session.request
+
+    Returns:
+        requests.Response: The response
+
+    Raises:
+        KMHFRCircuitOpen: If the breaker is open
+        requests.exceptions.RequestException: On connection errors/timeouts
+    """
+    _kmhfr_breaker.before_call()
+    try:
+        response = _get_kmhfr_session(base_url).request(method, url, **kwargs)
+    except requests.exceptions.RequestException:
+        _kmhfr_breaker.record_failure()
+        raise
+
+    if response.status_code >= 500:
+        _kmhfr_breaker.record_failure()
+    else:
+        _kmhfr_breaker.record_success()
+
+    return response
+
+
+class KMHFRBearer(AuthBase):
+    """
+    Bearer token auth for KMHFR requests.
+
+    The token is fetched lazily via authenticate_kmhfr() when not supplied. On a
+    401 response the cached token is invalidated and the request is re-sent once
+    with a fresh token (same approach as requests' HTTPDigestAuth).
+    """
+
+    def __init__(self, token=None, refresh_on_401=True):
+        self.token = token
+        # Refreshing needs frappe.local (settings + cache); disable off the main thread
+        self.refresh_on_401 = refresh_on_401
+
+    def __call__(self, request):
+        if not self.token:
+            self.token = authenticate_kmhfr()
+        request.headers["Authorization"] = f"Bearer {self.token}"
+        if self.refresh_on_401:
+            request.register_hook("response", self._handle_401)
+        return request
+
+    def _handle_401(self, response, **kwargs):
+        if response.status_code != 401:
+            return response
+
+        _invalidate_token()
+        self.token = authenticate_kmhfr()
+        if not self.token:
+            return response
+
+        # Drain the body so the connection is released before re-sending on it
+        _ = response.content
+        response.close()
+
+        retry_request = response.request.copy()
+        retry_request.headers["Authorization"] = f"Bearer {self.token}"
+        retry_response = response.connection.send(retry_request, **kwargs)
+        retry_response.history.append(response)
+        retry_response.request = retry_request
+        return retry_response
+
+
 @frappe.whitelist()
 def authenticate_kmhfr():
     """
-    Authenticate with KMHFR API and get access token
+    Authenticate with KMHFR API and get access token.
+    The token is cached in-process and in Redis (shared across workers) until
+    shortly before the expiry reported by the OAuth response.
 
     Returns:
         str: Access token or None if authentication fails
     """
+    base_url = _get_kmhfr_config().base_url
+    local_key = (frappe.local.site, base_url)
+    redis_key = _kmhfr_token_cache_key(base_url)
+
+    token, expires_at = _TOKEN_CACHE.get(local_key, (None, 0))
+    if token and time.time() < expires_at:
+        return token
+
+    cached = frappe.cache().get_value(redis_key)
+    if isinstance(cached, dict) and time.time() < cached.get("expires_at", 0):
+        # Another worker authenticated; keep it in-process until the same expiry
+        _TOKEN_CACHE[local_key] = (cached["token"], cached["expires_at"])
+        return cached["token"]
+
+    response_data = _request_kmhfr_token()
+    if not response_data:
+        return None
+
+    access_token = response_data["access_token"]
+    expires_in = int(
+        response_data.get("expires_in") or KMHFR_TOKEN_DEFAULT_EXPIRES_IN
+    )
+    ttl = max(expires_in - KMHFR_TOKEN_EXPIRY_MARGIN, 1)
+
+    expires_at = time.time() + ttl
+    _TOKEN_CACHE[local_key] = (access_token, expires_at)
+    frappe.cache().set_value(
+        redis_key, {"token": access_token, "expires_at": expires_at}, expires_in_sec=ttl
+    )
+
+    return access_token
+
+
+def _invalidate_token():
+    """Drop the cached KMHFR token (in-process and Redis) so the next call re-authenticates"""
+    base_url = _get_kmhfr_config().base_url
+    _TOKEN_CACHE.pop((frappe.local.site, base_url), None)
+    frappe.cache().delete_value(_kmhfr_token_cache_key(base_url))
+
+
+def _kmhfr_token_cache_key(base_url):
+    """Redis key for the KMHFR token of a base URL (Redis keys are already site-scoped)"""
+    return f"{KMHFR_TOKEN_CACHE_KEY}:{base_url}"
+
+
+def _request_kmhfr_token():
+    """
+    Perform the KMHFR OAuth password grant
+
+    Returns:
+        dict: OAuth response data (with 'access_token' and usually 'expires_in'),
+            or None if authentication fails
+    """
     try:
-        settings = frappe.get_single("HealthPro Backend Settings")
-        base_url = (
-            settings.get("kmhfr_api_base_url") or "https://api.kmhfr.health.go.ke"
-        )
-        username = settings.get("kmhfr_auth_username")
-        password = settings.get_password("kmhfr_auth_password")
-        kmhfr_basic_auth_username = settings.get("kmhfr_basic_auth_username")
-        kmhfr_basic_auth_password = settings.get_password("kmhfr_basic_auth_password")
+        config = _get_kmhfr_config()
+        base_url = config.base_url
+        username = config.username
+        password = config.password
+        kmhfr_basic_auth_username = config.basic_auth_username
+        kmhfr_basic_auth_password = config.basic_auth_password
 
         if not username or not password:
             frappe.log_error(
@@ -626,25 +1090,24 @@ def authenticate_kmhfr():
             return None
 
         url = f"{base_url}/o/token/"
+
+        # Pre-encoded form body, sent as-is (no per-call urlencoding)
+        data = config.token_request_body
         headers = {
             "Content-Type": "application/x-www-form-urlencoded",
+            "Content-Length": str(len(data)),
         }
 
         # Add Authorization header using Basic Auth
         auth = (kmhfr_basic_auth_username, kmhfr_basic_auth_password)
 
-        data = {
-            "grant_type": "password",
-            "username": username,
-            "password": password,
-            "scope": "read",
-        }
-
-        response = requests.post(url, headers=headers, data=data, timeout=30, auth=auth)
+        response = _kmhfr_request(
+            base_url, "POST", url, headers=headers, data=data, timeout=30, auth=auth
+        )
         if response.status_code != 200:
             frappe.log_error(
                 title="KMHFR Auth HTTP Error",
-                message=f"HTTP {response.status_code} error during authentication\nURL: {url}\nBasic Auth Username: {kmhfr_basic_auth_username}\nRequest Headers: {headers}\nRequest Data: {data}\nResponse: {response.text}",
+                message=f"HTTP {response.status_code} error during authentication\nURL: {url}\nBasic Auth Username: {kmhfr_basic_auth_username}\nRequest Headers: {headers}\nRequest Data: {data.decode()}\nResponse: {response.text}",
             )
             return None
 
@@ -659,7 +1122,7 @@ def authenticate_kmhfr():
             )
             return None
 
-        return access_token
+        return response_data
 
     except requests.exceptions.HTTPError as http_err:
         frappe.log_error(
@@ -668,6 +1131,9 @@ def authenticate_kmhfr():
         )
         return None
 
+    except KMHFRCircuitOpen:
+        return None
+
     except requests.exceptions.Timeout:
         frappe.log_error(
             title="KMHFR Auth Timeout",
@@ -694,19 +1160,30 @@ def _fetch_counties(token):
         dict: Response data with counties in 'results' array
     """
     try:
-        settings = frappe.get_single("HealthPro Backend Settings")
-        base_url = (
-            settings.get("kmhfr_api_base_url") or "https://api.kmhfr.health.go.ke"
-        )
+        base_url = _get_kmhfr_config().base_url
 
         url = f"{base_url}/api/common/counties"
-        headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
+        headers = {"Accept": "application/json"}
 
         params = {"page_size": 50, "format": "json"}
 
-        response = requests.get(url, headers=headers, params=params, timeout=30)
+        auth = KMHFRBearer(token)
+        response = _kmhfr_request(
+            base_url,
+            "GET",
+            url,
+            headers=headers,
+            params=params,
+            timeout=30,
+            auth=auth,
+        )
         response.raise_for_status()
-        return response.json()
+        return _collect_remaining_pages(
+            base_url, url, headers, params, response.json(), auth.token
+        )
+
+    except KMHFRCircuitOpen:
+        return {"results": []}
 
     except Exception as e:
         frappe.log_error(
@@ -716,122 +1193,274 @@ def _fetch_counties(token):
         return {"results": []}
 
 
-def _fetch_subcounties(county_id, token, retry_count=0):
+def _collect_remaining_pages(base_url, url, headers, params, first_page, token):
     """
-    Fetch sub-counties for a specific county from KMHFR API
+    Fetch pages 2..N of a paginated KMHFR list concurrently and append their
+    results to the first page. The page count is derived from the envelope's
+    'count' and the page size the server actually used (its 'page_size', or
+    the number of results on the first page), since the server may cap the
+    requested page_size; if 'count' is missing, the first page is returned as-is.
+
+    Args:
+        base_url (str): KMHFR API base URL
+        url (str): List endpoint URL
+        headers (dict): Request headers (without Authorization)
+        params (dict): Query params used for the first page
+        first_page (dict): Parsed JSON of the first page
+        token (str): Access token for KMHFR API
+
+    Returns:
+        dict: first_page with 'results' extended by all remaining pages
+
+    Raises:
+        requests.exceptions.RequestException: If any page fails to load
+    """
+    count = first_page.get("count")
+    page_size = first_page.get("page_size") or len(first_page.get("results") or [])
+    if not count or not page_size or count <= page_size:
+        return first_page
+
+    total_pages = math.ceil(count / page_size)
+
+    def fetch_page(page):
+        response = _kmhfr_request(
+            base_url,
+            "GET",
+            url,
+            headers=headers,
+            params={**params, "page": page},
+            timeout=30,
+            auth=KMHFRBearer(token, refresh_on_401=False),
+        )
+        response.raise_for_status()
+        return response.json().get("results", [])
+
+    with ThreadPoolExecutor(
+        max_workers=min(KMHFR_FETCH_THREADS, total_pages - 1)
+    ) as executor:
+        remaining_pages = list(executor.map(fetch_page, range(2, total_pages + 1)))
+
+    results = list(first_page.get("results", []))
+    for page_results in remaining_pages:
+        results.extend(page_results)
+
+    first_page["results"] = results
+    return first_page
+
+
+def _fetch_subcounties(county_id, token):
+    """
+    Fetch sub-counties for a specific county from KMHFR API.
+    Token refresh on 401 is handled by KMHFRBearer.
 
     Args:
         county_id (str): County UUID
         token (str): Access token for KMHFR API
-        retry_count (int): Number of retries attempted
 
     Returns:
         dict: Response data with sub-counties in 'results' array
     """
     try:
-        settings = frappe.get_single("HealthPro Backend Settings")
-        base_url = (
-            settings.get("kmhfr_api_base_url") or "https://api.kmhfr.health.go.ke"
-        )
+        base_url = _get_kmhfr_config().base_url
 
         url = f"{base_url}/api/common/sub_counties"
-        headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
+        headers = {"Accept": "application/json"}
 
         params = {"page_size": 400, "format": "json", "county": county_id}
 
-        response = requests.get(url, headers=headers, params=params, timeout=30)
-
-        # Handle token expiry (401 or 500)
-        if response.status_code in [401, 500] and retry_count == 0:
-            # Refresh token and retry once
-            new_token = authenticate_kmhfr()
-            if new_token:
-                return _fetch_subcounties(county_id, new_token, retry_count=1)
-
+        auth = KMHFRBearer(token)
+        response = _kmhfr_request(
+            base_url,
+            "GET",
+            url,
+            headers=headers,
+            params=params,
+            timeout=30,
+            auth=auth,
+        )
         response.raise_for_status()
-        return response.json()
+        return _collect_remaining_pages(
+            base_url, url, headers, params, response.json(), auth.token
+        )
+
+    except KMHFRCircuitOpen:
+        return {"results": []}
 
     except Exception as e:
-        frappe.log_error(
+        _log_exc(
             title=f"KMHFR Fetch Sub-Counties Error - County {county_id}",
-            message=f"Error fetching sub-counties: {str(e)}\n{frappe.get_traceback()}",
+            message=f"Error fetching sub-counties: {str(e)}",
         )
         return {"results": []}
 
 
+def _request_subcounties(base_url, county_id, token):
+    """
+    Plain HTTP fetch of one county's sub-counties. Safe to run off the main
+    thread: it touches neither the DB nor frappe.local.
+
+    Args:
+        base_url (str): KMHFR API base URL
+        county_id (str): County UUID
+        token (str): Access token for KMHFR API
+
+    Returns:
+        dict: Response data with sub-counties in 'results' array
+
+    Raises:
+        requests.exceptions.RequestException: On HTTP or connection errors
+    """
+    url = f"{base_url}/api/common/sub_counties"
+    headers = {"Accept": "application/json"}
+    params = {"page_size": 400, "format": "json", "county": county_id}
+
+    response = _kmhfr_request(
+        base_url,
+        "GET",
+        url,
+        headers=headers,
+        params=params,
+        timeout=30,
+        auth=KMHFRBearer(token, refresh_on_401=False),
+    )
+    response.raise_for_status()
+    return _collect_remaining_pages(
+        base_url, url, headers, params, response.json(), token
+    )
+
+
+def _prefetch_all_subcounties(counties, token):
+    """
+    Fetch sub-counties for all counties concurrently over the pooled session.
+
+    HTTP requests run on a thread pool; any county whose fetch fails is retried
+    on the calling thread through _fetch_subcounties, which handles token
+    refresh and error logging (DB access stays on the main thread).
+
+    Args:
+        counties (list): County dictionaries from KMHFR (must have 'id')
+        token (str): Access token for KMHFR API
+
+    Returns:
+        dict: {county_id: response data with sub-counties in 'results' array}
+    """
+    base_url = _get_kmhfr_config().base_url
+
+    county_ids = [county.get("id") for county in counties if county.get("id")]
+    subcounties_by_county = {}
+    failed_county_ids = []
+
+    with ThreadPoolExecutor(max_workers=KMHFR_FETCH_THREADS) as executor:
+        futures = {
+            county_id: executor.submit(_request_subcounties, base_url, county_id, token)
+            for county_id in county_ids
+        }
+        for county_id, future in futures.items():
+            try:
+                subcounties_by_county[county_id] = future.result()
+            except Exception:
+                failed_county_ids.append(county_id)
+
+    for county_id in failed_county_ids:
+        subcounties_by_county[county_id] = _fetch_subcounties(county_id, token)
+
+    return subcounties_by_county
+
+
 # ============================================================================
 # HELPER FUNCTIONS - County Processing
 # ============================================================================
 
 
-def _process_single_county(county, report):
+def _process_single_county(county, report, lookups):
     """
     Process a single county: Create Company, Healthcare Org, and all sub-counties (V2)
 
+    The _create_* helpers do not commit; everything for the county is committed
+    once here after its sub-counties are processed (rolled back on failure, along
+    with the county's additions to lookups).
+
     Args:
-        county (dict): County data with nested subcounties
+        county (dict): Normalized county data (see _normalize_counties)
         report (dict): Report dictionary to update with results
+        lookups (dict): Preloaded existing records (see _preload_sync_lookups)
     """
-    county_name = county.get("name")
-    county_id = county.get("id")
-    subcounties = county.get("subcounties", [])
+    county_name = county["name"]
+    subcounties = county["subcounties"]
 
-    # Convert county name to uppercase (should already be uppercase from JSON/API)
-    if county_name:
-        county_name = county_name.upper()
-
-    if not county_name or not county_id:
-        report["counties_failed"] += 1
-        report["errors"].append(
-            {
-                "type": "County",
-                "name": county_name or "Unknown",
-                "error": "Missing county name or ID",
-            }
-        )
-        return
+    # Shallow copies are enough: the helpers only add or replace entries
+    lookups_before = {key: value.copy() for key, value in lookups.items()}
 
     try:
+        existing_company = lookups["companies"].get(county_name)
+        if (
+            existing_company
+            and existing_company["is_group"]
+            and county_name in lookups["orgs"]
+        ):
+            # Re-run: Company (already a group) and Healthcare Organization both
+            # exist, so skip straight to sub-counties without calling the helpers
+            report["counties_skipped"] += 2
+            report["skipped"].extend(
+                [
+                    {"type": "Company", "name": county_name, "reason": "Already exists"},
+                    {
+                        "type": "Healthcare Organization",
+                        "name": county_name,
+                        "reason": "Already exists",
+                    },
+                ]
+            )
+            _process_county_subcounties(county_name, subcounties, report, lookups)
+            frappe.db.commit()
+            return
+
         # Phase 1: Create Company + Healthcare Organization
-        company_created = _create_county_company(county_name, report)
-        healthcare_org_created = _create_county_healthcare_org(county_name, report)
+        company_created = _create_county_company(county_name, report, lookups)
+        healthcare_org_created = _create_county_healthcare_org(
+            county_name, report, lookups
+        )
 
         if company_created and healthcare_org_created:
             report["counties_created"] += 1
 
             # Phase 2: Process sub-counties (already in county data, no API fetch)
-            _process_county_subcounties(county_name, subcounties, report)
+            _process_county_subcounties(county_name, subcounties, report, lookups)
         elif not company_created and not healthcare_org_created:
             # Both already exist - still process sub-counties
-            _process_county_subcounties(county_name, subcounties, report)
+            _process_county_subcounties(county_name, subcounties, report, lookups)
+
+        frappe.db.commit()
 
     except Exception as e:
+        frappe.db.rollback()
+        # Forget records that were rolled back, so later counties don't treat them as existing
+        lookups.update(lookups_before)
         report["counties_failed"] += 1
         report["errors"].append(
             {"type": "County", "name": county_name, "error": str(e)}
         )
-        frappe.log_error(
+        _log_exc(
             title=f"County Processing Error: {county_name}",
-            message=f"{str(e)}\n{frappe.get_traceback()}",
+            message=str(e),
         )
 
 
-def _process_county_subcounties(county_name, subcounties, report):
+def _process_county_subcounties(county_name, subcounties, report, lookups):
     """
     Process sub-counties for a specific county (V2 - uses pre-loaded data)
 
     Args:
         county_name (str): County name
-        subcounties (list): List of subcounty dictionaries (already loaded)
+        subcounties (list): Normalized subcounty dictionaries (already loaded)
         report (dict): Report dictionary to update with results
+        lookups (dict): Preloaded existing records (see _preload_sync_lookups)
     """
     try:
         # V2: subcounties already provided - no API fetch needed
 
         # Get the Healthcare Organization for this county
-        healthcare_org_name = frappe.db.get_value(
-            "Healthcare Organization", {"organization_name": county_name}, "name"
-        )
+        healthcare_org_name = lookups["orgs"].get(county_name)
 
         if not healthcare_org_name:
             frappe.log_error(
@@ -840,18 +1469,62 @@ def _process_county_subcounties(county_name, subcounties, report):
             )
             return
 
-        # Create Healthcare Organization Region for each sub-county
+        # Split sub-counties into new regions and ones that already exist
+        new_subcounty_names = []
+        seen_subcounty_names = set()
         for subcounty in subcounties:
-            subcounty_name = subcounty.get("name")
-            if subcounty_name:
-                # Convert sub-county name to uppercase (should already be uppercase)
-                subcounty_name = subcounty_name.upper()
-                _create_subcounty_region(subcounty_name, healthcare_org_name, report)
+            # Names are already uppercased and non-empty (see _normalize_counties)
+            subcounty_name = subcounty["name"]
+            if (
+                subcounty_name in lookups["regions"]
+                or subcounty_name in seen_subcounty_names
+            ):
+                report["subcounties_skipped"] += 1
+                report["skipped"].append(
+                    {
+                        "type": "Healthcare Organization Region",
+                        "name": subcounty_name,
+                        "reason": "Already exists",
+                    }
+                )
+                continue
+            seen_subcounty_names.add(subcounty_name)
+            new_subcounty_names.append(subcounty_name)
+
+        if not new_subcounty_names:
+            return
+
+        # V2: Skip async company creation in the region after_insert hook for the
+        # whole county (set once; companies are created synchronously below)
+        frappe.flags.skip_region_company_creation = True
+        try:
+            # Create all of the county's regions in one multi-row INSERT
+            region_names = _bulk_insert_subcounty_regions(
+                new_subcounty_names, healthcare_org_name, report, lookups
+            )
+
+            if region_names is None:
+                # Bulk insert failed (e.g. a concurrent duplicate): go row by row so
+                # only the offending sub-county fails
+                for subcounty_name in new_subcounty_names:
+                    _create_subcounty_region(
+                        subcounty_name, healthcare_org_name, report, lookups
+                    )
+                return
+
+            # V2: Create region companies synchronously in a second pass
+            for region_name in region_names:
+                _create_region_company_sync(
+                    region_name, healthcare_org_name, report, lookups
+                )
+        finally:
+            # Always clear flag (even if error occurs)
+            frappe.flags.skip_region_company_creation = False
 
     except Exception as e:
-        frappe.log_error(
+        _log_exc(
             title=f"Sub-County Processing Error - County {county_name}",
-            message=f"Error processing sub-counties: {str(e)}\n{frappe.get_traceback()}",
+            message=f"Error processing sub-counties: {str(e)}",
         )
 
 
@@ -860,87 +1533,97 @@ def _process_county_subcounties(county_name, subcounties, report):
 # ============================================================================
 
 
-def _generate_county_company_abbreviation(county_name):
+def _trusted_db_insert(doc):
+    """
+    Insert a document directly with db_insert(), skipping controller validation,
+    permission checks and doc events.
+
+    Only for this one-shot setup path where the payload is built here from
+    trusted county data and existence has already been checked. Do not reuse
+    for user input or for doctypes whose controllers create dependent records.
+
+    Args:
+        doc (Document): Unsaved document built with frappe.new_doc()
+
+    Returns:
+        Document: The inserted document (with its name set)
+    """
+    doc.docstatus = 0
+    doc.set_user_and_timestamp()
+    doc.set_new_name()
+    doc.db_insert()
+    return doc
+
+
+def _generate_county_company_abbreviation(county_name, existing_abbrs):
     """
     Generate unique abbreviation for county company.
     Format: First 3-5 letters of county name (uppercase)
     Example: "NAIROBI" → "NAI", "TANA RIVER" → "TANRI"
     If duplicate, adds incremental suffix: "NAI-001", "NAI-002", etc.
 
+    Uniqueness is checked against existing_abbrs (no DB queries); the chosen
+    abbreviation is added to the set, reserving it for the rest of the batch
+    (e.g. KISUMU and KISII both start from "KIS").
+
     Args:
         county_name (str): Name of the county
+        existing_abbrs (set): Company abbreviations already taken
 
     Returns:
         str: Unique abbreviation
     """
-    # Remove common words and clean the name
+    # Clean the name once (single upper()), then slice by word count:
+    # 1 word  → first 3 letters        "NAIROBI" → "NAI"
+    # 2 words → 3 + 2 letters          "TANA RIVER" → "TANRI"
+    # 3+ words → 2 letters of each     capped at 5 characters
     county_clean = county_name.strip().upper()
-
-    # For multi-word counties, take first 2-3 letters of each word
     words = county_clean.split()
-    if len(words) > 1:
-        # Multi-word: Take first 2-3 letters of each word
-        # "TANA RIVER" → "TANRI" (3 + 2)
-        # "WEST POKOT" → "WESPOK" (3 + 3)
-        if len(words) == 2:
-            base_abbr = f"{words[0][:3]}{words[1][:2]}"
-        else:
-            # 3+ words: Take first 2 letters of each
-            base_abbr = "".join(word[:2] for word in words)
-    else:
-        # Single word: Take first 3-5 letters
-        # "NAIROBI" → "NAI"
-        # "MOMBASA" → "MOM"
-        base_abbr = county_clean[:3]
-
-    # Ensure it's uppercase and max 5 characters for base
-    base_abbr = base_abbr[:5].upper()
-
-    # Check if base abbreviation is available
-    if not frappe.db.exists("Company", {"abbr": base_abbr}):
-        return base_abbr
-
-    # If duplicate, add incremental suffix: -001, -002, etc.
-    counter = 1
-    while True:
-        new_abbr = f"{base_abbr}-{counter:03d}"  # Format as 001, 002, etc.
-        if not frappe.db.exists("Company", {"abbr": new_abbr}):
-            return new_abbr
+    base_abbr = (
+        words[0][:3] + words[1][:2]
+        if len(words) == 2
+        else ("".join(w[:2] for w in words) if len(words) > 2 else county_clean[:3])
+    )[:5]
+
+    # Use the base abbreviation if free, else the first free -001 .. -999 suffix
+    candidate = base_abbr
+    counter = 0
+    while candidate in existing_abbrs:
         counter += 1
-
-        # Safety check to prevent infinite loop
         if counter > 999:
             frappe.throw(f"Unable to generate unique abbreviation for {county_name}")
+        candidate = f"{base_abbr}-{counter:03d}"  # Format as 001, 002, etc.
 
+    existing_abbrs.add(candidate)
+    return candidate
 
-def _create_county_company(county_name, report):
+
+def _create_county_company(county_name, report, lookups):
     """
     Create Company record for a county
 
     Args:
         county_name (str): Name of the county
         report (dict): Report dictionary to update with results
+        lookups (dict): Preloaded existing records (see _preload_sync_lookups)
 
     Returns:
         bool: True if created, False if skipped (already exists)
     """
     try:
         # Check if Company already exists
-        if frappe.db.exists("Company", {"company_name": county_name}):
+        existing_company = lookups["companies"].get(county_name)
+        if existing_company:
             # Update existing company to ensure it's marked as group company
-            company_name = frappe.db.get_value(
-                "Company", {"company_name": county_name}, "name"
-            )
+            company_name = existing_company["name"]
 
-            # Check if it's already a group company
-            is_group = frappe.db.get_value("Company", company_name, "is_group")
-
-            if not is_group:
+            if not existing_company["is_group"]:
                 # Update to make it a group company (required for child region companies)
                 frappe.db.set_value("Company", company_name, "is_group", 1)
-                frappe.db.commit()
+                # Replace rather than mutate the entry, so a county rollback can restore it
+                lookups["companies"][county_name] = frappe._dict(existing_company, is_group=1)
 
-                frappe.log_error(
+                _log_sync_debug(
                     title=f"Company Updated - {county_name}",
                     message=f"Updated existing company '{company_name}' to be a group company (is_group=1)",
                 )
@@ -952,9 +1635,12 @@ def _create_county_company(county_name, report):
             return False
 
         # Generate unique abbreviation
-        abbr = _generate_county_company_abbreviation(county_name)
+        abbr = _generate_county_company_abbreviation(county_name, lookups["abbrs"])
 
         # Create Company
+        # Company keeps the full insert(): ERPNext builds the chart of accounts,
+        # cost centers and warehouses in its controller, so it can't use
+        # _trusted_db_insert like the Healthcare Organization/Region records.
         company_doc = frappe.get_doc(
             {
                 "doctype": "Company",
@@ -966,12 +1652,12 @@ def _create_county_company(county_name, report):
             }
         )
         company_doc.insert(ignore_permissions=True)
-        frappe.db.commit()
 
-        frappe.log_error(
-            title=f"County Company Created - {county_name}",
-            message=f"✅ SUCCESS: Company '{county_name}' created with abbreviation '{abbr}'",
+        lookups["companies"][county_name] = frappe._dict(
+            name=company_doc.name, company_name=county_name, abbr=abbr, is_group=1
         )
+        report["created"].append({"type": "Company", "name": county_name, "abbr": abbr})
+        _sync_logger().info(f"County Company created: {county_name} (abbr {abbr})")
 
         return True
 
@@ -980,29 +1666,28 @@ def _create_county_company(county_name, report):
         report["errors"].append(
             {"type": "Company", "name": county_name, "error": str(e)}
         )
-        frappe.log_error(
+        _log_exc(
             title=f"Company Creation Error: {county_name}",
-            message=f"Error creating Company: {str(e)}\n{frappe.get_traceback()}",
+            message=f"Error creating Company: {str(e)}",
         )
         return False
 
 
-def _create_county_healthcare_org(county_name, report):
+def _create_county_healthcare_org(county_name, report, lookups):
     """
     Create Healthcare Organization record for a county
 
     Args:
         county_name (str): Name of the county
         report (dict): Report dictionary to update with results
+        lookups (dict): Preloaded existing records (see _preload_sync_lookups)
 
     Returns:
         bool: True if created, False if skipped (already exists)
     """
     try:
         # Check if Healthcare Organization already exists
-        if frappe.db.exists(
-            "Healthcare Organization", {"organization_name": county_name}
-        ):
+        if county_name in lookups["orgs"]:
             report["counties_skipped"] += 1
             report["skipped"].append(
                 {
@@ -1014,9 +1699,8 @@ def _create_county_healthcare_org(county_name, report):
             return False
 
         # Get the Company name to link
-        company_name = frappe.db.get_value(
-            "Company", {"company_name": county_name}, "name"
-        )
+        company = lookups["companies"].get(county_name)
+        company_name = company["name"] if company else None
 
         if not company_name:
             report["counties_failed"] += 1
@@ -1029,16 +1713,18 @@ def _create_county_healthcare_org(county_name, report):
             )
             return False
 
-        # Create Healthcare Organization
-        healthcare_org_doc = frappe.get_doc(
+        # Create Healthcare Organization (trusted setup path, see _trusted_db_insert)
+        healthcare_org_doc = frappe.new_doc("Healthcare Organization")
+        healthcare_org_doc.update(
             {
-                "doctype": "Healthcare Organization",
                 "organization_name": county_name,
                 "company": company_name,
             }
         )
-        healthcare_org_doc.insert(ignore_permissions=True)
-        frappe.db.commit()
+        _trusted_db_insert(healthcare_org_doc)
+
+        lookups["orgs"][county_name] = healthcare_org_doc.name
+        _sync_logger().info(f"Healthcare Organization created: {county_name}")
 
         return True
 
@@ -1047,32 +1733,37 @@ def _create_county_healthcare_org(county_name, report):
         report["errors"].append(
             {"type": "Healthcare Organization", "name": county_name, "error": str(e)}
         )
-        frappe.log_error(
+        _log_exc(
             title=f"Healthcare Organization Creation Error: {county_name}",
-            message=f"Error creating Healthcare Organization: {str(e)}\n{frappe.get_traceback()}",
+            message=f"Error creating Healthcare Organization: {str(e)}",
         )
         return False
 
 
-def _create_region_company_sync(region_name, parent_org_name, report):
+def _create_region_company_sync(region_name, parent_org_name, report, lookups):
     """
     Create company for a region synchronously (same worker, no background job).
     This eliminates lock contention by processing regions sequentially.
 
     Based on logic from user_registration.create_region_companies_async() but:
     - Runs synchronously (not in background job)
-    - Commits immediately after creation
+    - Does not commit; the county's transaction is committed by _process_single_county
     - Updates report counters
 
     Args:
         region_name (str): Healthcare Organization Region name
         parent_org_name (str): Parent Healthcare Organization name
         report (dict): Report dictionary to update with results
+        lookups (dict): Preloaded existing records (see _preload_sync_lookups)
     """
     try:
-        # Get the region document
-        region_doc = frappe.get_doc("Healthcare Organization Region", region_name)
-        parent_org = frappe.get_doc("Healthcare Organization", parent_org_name)
+        # Only a few fields are needed, so read them instead of loading full documents
+        region_doc = frappe.db.get_value(
+            "Healthcare Organization Region", region_name, ["region_name"], as_dict=True
+        )
+        parent_org = frappe.db.get_value(
+            "Healthcare Organization", parent_org_name, ["name", "company"], as_dict=True
+        )
 
         if not parent_org.company:
             frappe.log_error(
@@ -1081,13 +1772,15 @@ def _create_region_company_sync(region_name, parent_org_name, report):
             )
             return
 
-        parent_company = frappe.get_doc("Company", parent_org.company)
+        parent_company = frappe.db.get_value(
+            "Company", parent_org.company, ["company_name"], as_dict=True
+        )
 
         # Create company name
         company_name = f"{parent_company.company_name} - {region_doc.region_name}"
 
-        # Check if company already exists
-        if frappe.db.exists("Company", company_name):
+        # Check if company already exists (Company is named by company_name)
+        if company_name in lookups["companies"]:
             # Link existing company to region
             frappe.db.set_value(
                 "Healthcare Organization Region",
@@ -1095,7 +1788,6 @@ def _create_region_company_sync(region_name, parent_org_name, report):
                 "company",
                 company_name,
             )
-            frappe.db.commit()
             return
 
         # Generate abbreviation
@@ -1121,7 +1813,6 @@ def _create_region_company_sync(region_name, parent_org_name, report):
         )
 
         new_company.insert(ignore_permissions=True)
-        frappe.db.commit()
 
         # Update region with company name
         frappe.db.set_value(
@@ -1130,37 +1821,92 @@ def _create_region_company_sync(region_name, parent_org_name, report):
             "company",
             new_company.name,
         )
-        frappe.db.commit()
 
-        frappe.log_error(
-            title=f"Region Company Created (Sync) - {region_name}",
-            message=f"✅ SUCCESS: Company '{company_name}' created synchronously and linked to region '{region_name}'",
+        lookups["companies"][company_name] = frappe._dict(
+            name=new_company.name, company_name=company_name, abbr=abbr, is_group=0
+        )
+        lookups["abbrs"].add(abbr)
+        report["created"].append(
+            {"type": "Company", "name": company_name, "region": region_name}
+        )
+        _sync_logger().info(
+            f"Region Company created: {company_name} (region {region_name})"
         )
 
     except Exception as e:
-        frappe.log_error(
+        _log_exc(
             title=f"Region Company Creation Error (Sync) - {region_name}",
-            message=f"Failed to create company for region '{region_name}': {str(e)}\n{frappe.get_traceback()}",
+            message=f"Failed to create company for region '{region_name}': {str(e)}",
         )
 
 
-def _create_subcounty_region(subcounty_name, parent_org_name, report):
+def _bulk_insert_subcounty_regions(subcounty_names, parent_org_name, report, lookups):
     """
-    Create Healthcare Organization Region record for a sub-county (V2 - with synchronous company creation)
+    Insert Healthcare Organization Region records for new sub-counties with a
+    single frappe.db.bulk_insert (trusted setup path, no controller hooks, as in
+    _trusted_db_insert). Region companies are created by the caller afterwards.
+
+    Args:
+        subcounty_names (list): Uppercase names of sub-counties that don't exist yet
+        parent_org_name (str): Name of the parent Healthcare Organization
+        report (dict): Report dictionary to update with results
+        lookups (dict): Preloaded existing records (see _preload_sync_lookups)
+
+    Returns:
+        list: Names of the inserted regions, or None if the bulk insert failed
+            (rolled back to before the insert; caller should fall back per row)
+    """
+    region_docs = []
+    for subcounty_name in subcounty_names:
+        region_doc = frappe.new_doc("Healthcare Organization Region")
+        region_doc.update(
+            {
+                "region_name": subcounty_name,
+                "parent_organization": parent_org_name,
+            }
+        )
+        region_doc.docstatus = 0
+        region_doc.set_user_and_timestamp()
+        region_doc.set_new_name()
+        region_docs.append(region_doc)
+
+    rows = [doc.get_valid_dict(convert_dates_to_str=True) for doc in region_docs]
+    fields = list(rows[0])
+
+    frappe.db.savepoint("subcounty_regions")
+    try:
+        frappe.db.bulk_insert(
+            "Healthcare Organization Region",
+            fields=fields,
+            values=[tuple(row[field] for field in fields) for row in rows],
+            chunk_size=100,
+        )
+    except Exception:
+        frappe.db.rollback(save_point="subcounty_regions")
+        return None
+
+    lookups["regions"].update(subcounty_names)
+    report["subcounties_created"] += len(region_docs)
+    return [doc.name for doc in region_docs]
+
+
+def _create_subcounty_region(subcounty_name, parent_org_name, report, lookups):
+    """
+    Create Healthcare Organization Region record for a sub-county (V2 - with synchronous company creation).
+    Row-by-row fallback for when _bulk_insert_subcounty_regions fails.
 
     Args:
         subcounty_name (str): Name of the sub-county
         parent_org_name (str): Name of the parent Healthcare Organization
         report (dict): Report dictionary to update with results
+        lookups (dict): Preloaded existing records (see _preload_sync_lookups)
 
     Returns:
         bool: True if created, False if skipped (already exists)
     """
     try:
         # Check if Healthcare Organization Region already exists
-        if frappe.db.exists(
-            "Healthcare Organization Region", {"region_name": subcounty_name}
-        ):
+        if subcounty_name in lookups["regions"]:
             report["subcounties_skipped"] += 1
             report["skipped"].append(
                 {
@@ -1171,31 +1917,24 @@ def _create_subcounty_region(subcounty_name, parent_org_name, report):
             )
             return False
 
-        # V2: Set flag to skip async company creation in after_insert hook
-        frappe.flags.skip_region_company_creation = True
-
-        try:
-            # Create Healthcare Organization Region (after_insert hook will skip enqueueing)
-            region_doc = frappe.get_doc(
-                {
-                    "doctype": "Healthcare Organization Region",
-                    "region_name": subcounty_name,
-                    "parent_organization": parent_org_name,
-                }
-            )
-            region_doc.insert(ignore_permissions=True)
-            frappe.db.commit()
-
-            report["subcounties_created"] += 1
+        # Create Healthcare Organization Region (trusted setup path, no controller hooks;
+        # skip_region_company_creation is set by _process_county_subcounties)
+        region_doc = frappe.new_doc("Healthcare Organization Region")
+        region_doc.update(
+            {
+                "region_name": subcounty_name,
+                "parent_organization": parent_org_name,
+            }
+        )
+        _trusted_db_insert(region_doc)
 
-            # V2: Create company synchronously (in the same worker, no background job)
-            _create_region_company_sync(region_doc.name, parent_org_name, report)
+        lookups["regions"].add(subcounty_name)
+        report["subcounties_created"] += 1
 
-            return True
+        # V2: Create company synchronously (in the same worker, no background job)
+        _create_region_company_sync(region_doc.name, parent_org_name, report, lookups)
 
-        finally:
-            # Always clear flag (even if error occurs)
-            frappe.flags.skip_region_company_creation = False
+        return True
 
     except Exception as e:
         report["subcounties_failed"] += 1
@@ -1206,8 +1945,8 @@ def _create_subcounty_region(subcounty_name, parent_org_name, report):
                 "error": str(e),
             }
         )
-        frappe.log_error(
+        _log_exc(
             title=f"Healthcare Organization Region Creation Error: {subcounty_name}",
-            message=f"Error creating Region: {str(e)}\n{frappe.get_traceback()}",
+            message=f"Error creating Region: {str(e)}",
         )
         return False
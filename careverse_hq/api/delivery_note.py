@@ -1,12 +1,35 @@
 import frappe, bleach, re
 from frappe import _, _dict
-from frappe.utils import nowdate, cint, flt, now_datetime
-from frappe.exceptions import ValidationError, PermissionError, UniqueValidationError
+from frappe.utils import nowdate, flt, now_datetime, add_days, getdate
+from frappe.exceptions import UniqueValidationError
 from collections import defaultdict, Counter
 from typing import Any, Dict
 from .purchase_order import _update_linked_device_requests
-from .utils import api_response, handle_workflow, get_uploaded_documents, sanitize_request
-from healthpro_erp.healthpro_erp.decorators.permissions import auth_required, AuthError
+from .utils import api_response, api_errors, handle_workflow, get_uploaded_documents, sanitize_request, get_list_page_with_total
+from healthpro_erp.healthpro_erp.decorators.permissions import auth_required
+
+
+_DUP_RE = re.compile(r"Duplicate entry '([^']+)' for key '([^']+)'")
+
+# Delivered items and attachments can change without touching the note itself;
+# such changes clear the cache through `clear_delivery_note_detail_cache`
+DELIVERY_NOTE_DETAIL_CACHE_TTL = 300  # seconds
+
+_MISSING_ITEM_CODE_MSG = "{0} do not have 'item_code'"
+_MISSING_DEVICE_FIELDS_MSG = "{0} do not have 'item_code' or 'serial' or 'sim_serial' or 'device_type'"
+
+_DELIVERY_NOTE_STATUS_MAP = {
+    "dispatched": ("Dispatched by Vendor", "Dispatched by County"),
+    "delivered": ("Received by County", "Received by Facility"),
+}
+
+# (request param, Purchase Receipt field, operator) for optional list filters
+_DELIVERY_NOTE_PARAM_FILTERS = (
+    ("from_date", "posting_date", ">="),
+    ("purchase_order", "custom_purchase_order", "="),
+    ("county", "company", "="),
+    ("search", "name", "="),
+)
 
 
 # ===== Helper Functions =====
@@ -36,12 +59,7 @@ def _read_query_params(kwargs: dict, expected_fields: list[str]) -> dict:
     Extract and normalize common query params from API kwargs
     by extracting expected fields.
     """
-    params = {}
-
-    for field in expected_fields:
-        params[field] = kwargs.get(field)
-
-    return params
+    return {field: kwargs.get(field) for field in expected_fields}
 
 def _validate_request_data(
     params: dict, required_fields: list[tuple[str, str]]
@@ -71,44 +89,38 @@ def _validate_request_data(
         message = "Missing required fields: " + ", ".join(missing_fields)
         frappe.throw(message, frappe.ValidationError)
 
-def _build_delivery_notes_filter(params):
-    filters = []
-
-    status_map = {
-        "dispatched": ["Dispatched by Vendor", "Dispatched by County"],
-        "delivered": ["Received by County", "Received by Facility"],
-    }
+def _build_workflow_state_filter(filter):
+    if filter in _DELIVERY_NOTE_STATUS_MAP:
+        return ["workflow_state", "in", list(_DELIVERY_NOTE_STATUS_MAP[filter])]
+    if filter == "draft":
+        return ["workflow_state", "=", "Draft"]
+    if filter == "all":
+        return ["workflow_state", "!=", "Draft"]
+    return ["workflow_state", "=", filter]
 
-    filter = params.get("filter")
-    if filter in status_map:
-        filters.append(["workflow_state", "in", status_map[filter]])
-    elif filter == "draft":
-        filters.append(["workflow_state", "=", "Draft"])
-    elif filter == "all":
-        filters.append(["workflow_state", "!=", "Draft"])
-    else:
-        filters.append(["workflow_state", "=", filter])
+def _build_delivery_notes_filter(params):
+    filters = [_build_workflow_state_filter(params.get("filter"))]
 
-    if params.get("from_date"):
-        filters.append(["posting_date", ">=", params.get("from_date")])
+    for param, fieldname, operator in _DELIVERY_NOTE_PARAM_FILTERS:
+        value = params.get(param)
+        if value:
+            filters.append([fieldname, operator, value])
 
+    # Half-open upper bound keeps the posting_date range index-friendly
     if params.get("to_date"):
-        filters.append(["posting_date", "<=", params.get("to_date")])
-
-    if params.get("purchase_order"):
-        filters.append(["custom_purchase_order", "=", params.get("purchase_order")])
-    
-    if params.get("county"):
-        filters.append(["company", "=", params.get("county")])
-        
-    if params.get("search"):
-        filters.append(["name", "=", params.get("search")])
+        filters.append(["posting_date", "<", add_days(getdate(params.get("to_date")), 1)])
 
     return filters
 
 
+def _validation_error_message(ve):
+    msg = str(ve)
+    if isinstance(ve, UniqueValidationError):
+        msg = _format_duplicate_entry_validation_msg(msg)
+    return msg
+
 def _format_duplicate_entry_validation_msg(error_msg):
-    m = re.search(r"Duplicate entry '([^']+)' for key '([^']+)'", error_msg)
+    m = _DUP_RE.search(error_msg)
     if m:
         dup_value, dup_field = m.groups()
         field_label = dup_field.replace("_", " ").title()
@@ -116,9 +128,6 @@ def _format_duplicate_entry_validation_msg(error_msg):
         return msg
     return error_msg
                 
-def _has_purchase_receipt(po_id):
-    return frappe.db.exists("Purchase Receipt Item", {"purchase_order": po_id})
-
 def _get_valid_purchase_order(po_id):
     try:
         return frappe.get_doc("Purchase Order", po_id)
@@ -131,6 +140,16 @@ def _get_valid_purchase_receipt(pr_id):
     except frappe.DoesNotExistError:
         return None
     
+def _get_draft_purchase_receipts(po_id):
+    return frappe.get_list(
+        "Purchase Receipt",
+        filters={
+            "workflow_state": "Draft",
+            "purchase_order": po_id
+        },
+        pluck="name"
+    )
+
 def _validate_criteria_for_purchase_receipt_generation(po):
     po_id = po.name
     
@@ -142,14 +161,7 @@ def _validate_criteria_for_purchase_receipt_generation(po):
         frappe.throw(_(f"Purchase Order '{po_id}' is already fulfilled.", frappe.ValidationError))
     
     # Check if any related Purchase Receipt is still in Draft
-    draft_pr = frappe.get_list(
-        "Purchase Receipt",
-        filters={
-            "workflow_state": "Draft",
-            "purchase_order": po_id
-        },
-        pluck="name"
-    )
+    draft_pr = _get_draft_purchase_receipts(po_id)
     
     if draft_pr:
         frappe.throw(
@@ -168,157 +180,160 @@ def _validate_criteria_for_purchase_receipt_updation(po):
         frappe.throw(_(f"Purchase Order '{po_id}' is already fulfilled.", frappe.ValidationError))
         
 def _get_po_items_grouped(po):
+    """
+    Aggregate PO items by item_code in a single pass.
+
+    Returns:
+        tuple: (total_qty, item_map), cached on the PO instance.
+    """
+    cached = getattr(po, "_po_item_agg", None)
+    if cached is not None:
+        return cached
+
     item_map = {}
+    total_qty = 0
     for item in po.items:        
+        qty = int(item.qty)
         if item.item_code in item_map:
             # Add qty if already exists
-            item_map[item.item_code]["qty"] += int(item.qty)
+            item_map[item.item_code]["qty"] += qty
         else:
             # Store item with initial qty
             item_map[item.item_code] = {
                 "item_type": item.item_group, "item_name": item.item_name,
-                "item_code": item.item_code, "qty": int(item.qty),
+                "item_code": item.item_code, "qty": qty,
                 "parent": item.parent, "rate": item.rate, "uom": item.uom, "warehouse": item.warehouse
             }
+        total_qty += qty
 
-    return item_map
+    po._po_item_agg = (total_qty, item_map)
+    return po._po_item_agg
     
 def _get_delivered_po_items_grouped(po_id: str):
-    
-    pr_ids = frappe.get_list(
-        "Purchase Receipt",
-        filters={
-            "purchase_order": po_id,
-            "docstatus": 1
-        },
-        fields=[
-            "name"
-        ],
-        group_by="name"
-    )
-    purchase_receipts = [frappe.get_doc("Purchase Receipt", pr_id.name) for pr_id in pr_ids]
-    
+    """
+    Aggregate delivered quantities per item_code across all submitted
+    Purchase Receipts for a given Purchase Order, in a single query.
+    """
+    rows = frappe.db.sql("""
+        SELECT pri.item_code, pri.item_name, pri.item_group, pri.qty
+        FROM `tabPurchase Receipt Item` pri
+        JOIN `tabPurchase Receipt` pr ON pr.name = pri.parent
+        WHERE pri.purchase_order = %s AND pr.docstatus = 1
+    """, (po_id,), as_dict=1)
+
     item_map = {}
-    for pr in purchase_receipts:
-        for item in pr.items:
-            pr_item = item.as_dict()
-            qty = int(pr_item.qty)
-            if pr_item.item_code in item_map:
-                item_map[pr_item.item_code]["qty"] += qty
-            else:
-                item_map[pr_item.item_code] = {
-                    "item_type": pr_item.item_group, "item_name": pr_item.item_name,
-                    "item_code": pr_item.item_code, "qty": qty
-                }
+    for row in rows:
+        # Ensure qty is int (frappe.db.sql may return Decimal)
+        qty = int(row.qty)
+        if row.item_code in item_map:
+            item_map[row.item_code]["qty"] += qty
+        else:
+            item_map[row.item_code] = {
+                "item_type": row.item_group, "item_name": row.item_name,
+                "item_code": row.item_code, "qty": qty
+            }
 
     return item_map
 
-def _get_delivered_items_detail(po_id: str):
+def _get_delivered_items_detail(item_map: dict):
     """
-    Fetch aggregated delivered items for a given Purchase Order.
-    Only considers submitted/non-draft Purchase Receipts.
+    Summarize the delivered items map returned by
+    `_get_delivered_po_items_grouped` into a total and a list.
     """
-    pr_ids = frappe.get_list(
-        "Purchase Receipt",
-        filters={
-            "purchase_order": po_id,
-            "docstatus": 1
-        },
-        fields=[
-            "name"
-        ],
-        group_by="name"
-    )
-    purchase_receipts = [frappe.get_doc("Purchase Receipt", pr_id.name) for pr_id in pr_ids]
-    
-    # Ensure qty is int (frappe.db.sql may return Decimal)
-    total_delivered_items = 0
-    item_map = {}
-    for pr in purchase_receipts:
-        for item in pr.items:
-            pr_item = item.as_dict()
-            qty = int(pr_item.qty)
-            if pr_item.item_code in item_map:
-                item_map[pr_item.item_code]["qty"] += qty
-            else:
-                item_map[pr_item.item_code] = {
-                    "item_type": pr_item.item_group, "item_name": pr_item.item_name,
-                    "item_code": pr_item.item_code, "qty": qty
-                }
-            total_delivered_items += qty
+    total_delivered_items = sum(v["qty"] for v in item_map.values())
     delivered_items_detail = list(item_map.values())
 
     return total_delivered_items, delivered_items_detail
 
 
 def _group_incoming_items(incoming_items, is_draft = 0):
+    require_serials = not is_draft
     items_grouped = defaultdict(list)
     for item in incoming_items:
         item_code = item.get("item_code")
         if not item_code:
-            frappe.throw(_(f"{item_code} do not have 'item_code'"), frappe.ValidationError)
-        if not is_draft and (not item.get("serial") or not item.get("sim_serial") or not item.get("device_type")):
-            frappe.throw(_(f"{item_code} do not have 'item_code' or 'serial' or 'sim_serial' or 'device_type'"), frappe.ValidationError)
+            frappe.throw(_(_MISSING_ITEM_CODE_MSG).format(item_code), frappe.ValidationError)
+        if require_serials and (not item.get("serial") or not item.get("sim_serial") or not item.get("device_type")):
+            frappe.throw(_(_MISSING_DEVICE_FIELDS_MSG).format(item_code), frappe.ValidationError)
 
         items_grouped[item_code].append(item)
     return items_grouped
 
-def _validate_incoming_quantity_against_po(po_id, po_item_map, items_grouped, delivered_po_items_grouped):
+def _check_item_quantities(incoming, delivered, ordered):
+    """
+    Compare aligned per-item quantity sequences.
+
+    Returns:
+        tuple: (is_fully_fulfilled, index of the first incoming item whose
+        incoming + delivered quantity exceeds the ordered quantity, or -1).
+    """
     is_fully_fulfilled = True
-    fresh_items_count = 0
-    
-    for item_code, entries in items_grouped.items():
+    for i, (incoming_qty, delivered_qty, ordered_qty) in enumerate(zip(incoming, delivered, ordered, strict=True)):
+        total = incoming_qty + delivered_qty
+        if incoming_qty and total > ordered_qty:
+            return False, i
+        if total < ordered_qty:
+            is_fully_fulfilled = False
+    return is_fully_fulfilled, -1
+
+def _validate_incoming_quantity_against_po(po_id, po_item_map, items_grouped, delivered_po_items_grouped):
+    for item_code in items_grouped:
         if item_code not in po_item_map:
-            frappe.throw(_(f"Item '{item_code}' not found in Purchase Order '{po_id}'", frappe.ValidationError))
-            
-        is_fresh_item = False
-        delivered_qty = 0
-        
-        qty = len(entries)
-        ordered_qty = cint(po_item_map[item_code]["qty"])
-                           
-        if delivered_po_items_grouped and item_code in delivered_po_items_grouped:
-            delivered_qty = delivered_po_items_grouped[item_code]["qty"]
-        else:
-            is_fresh_item = True
-            fresh_items_count += 1
-            
-        if is_fresh_item:
-            if qty > ordered_qty:
-                frappe.throw(_(
-                    f"Item '{item_code}' has {qty} quantity, "
-                    f"but only {ordered_qty} oredered in PO '{po_id}'",
-                    frappe.ValidationError
-                ))
-        else:
-            if qty + delivered_qty > ordered_qty:
-                frappe.throw(_(
-                    f"Item '{item_code}' has {delivered_qty} quantity delivered already, current delivery note has {qty} quantity which makes the total quantity {delivered_qty + qty}, "
-                    f"but only {ordered_qty} ordered in PO '{po_id}'",
-                    frappe.ValidationError
-                ))
-                
-        if is_fresh_item:
-            if qty < ordered_qty:
-                is_fully_fulfilled = False
+            msg = f"Item '{item_code}' not found in Purchase Order '{po_id}'"
+            frappe.throw(_(msg), frappe.ValidationError)
+
+    # Align incoming / delivered / ordered quantities on the PO item codes
+    # (_get_po_items_grouped already stores qty as int)
+    item_codes = list(po_item_map)
+    incoming = [len(items_grouped.get(code, ())) for code in item_codes]
+    delivered = [
+        delivered_po_items_grouped[code]["qty"] if code in delivered_po_items_grouped else 0
+        for code in item_codes
+    ]
+    ordered = [po_item_map[code]["qty"] for code in item_codes]
+
+    is_fully_fulfilled, over_idx = _check_item_quantities(incoming, delivered, ordered)
+
+    if over_idx >= 0:
+        # Build the error message only when actually throwing
+        item_code = item_codes[over_idx]
+        qty, delivered_qty, ordered_qty = incoming[over_idx], delivered[over_idx], ordered[over_idx]
+        if item_code not in delivered_po_items_grouped:
+            msg = (
+                f"Item '{item_code}' has {qty} quantity, "
+                f"but only {ordered_qty} ordered in PO '{po_id}'"
+            )
         else:
-            if qty + delivered_qty < ordered_qty:
-                is_fully_fulfilled = False
-    
-    if delivered_po_items_grouped:
-        for item_code, entry in delivered_po_items_grouped.items():
-            ordered_qty = cint(po_item_map[item_code]["qty"])
-            if item_code not in items_grouped and entry["qty"] < ordered_qty:
-                is_fully_fulfilled = False
-                
-    if fresh_items_count + len(delivered_po_items_grouped) < len(po_item_map):
-        is_fully_fulfilled = False
+            msg = (
+                f"Item '{item_code}' has {delivered_qty} quantity delivered already, current delivery note has {qty} quantity which makes the total quantity {delivered_qty + qty}, "
+                f"but only {ordered_qty} ordered in PO '{po_id}'"
+            )
+        frappe.throw(_(msg), frappe.ValidationError)
                 
     return is_fully_fulfilled
         
 def _set_purchase_receipt_items_and_details(pr, po_item_map, items_grouped):
     total_qty = total_amount = 0
-    # Set PR Items
+
+    # Prefetch the warehouses referenced by the incoming items in one query
+    warehouse_names = list({
+        po_item_map[code]["warehouse"] for code in items_grouped
+        if code in po_item_map and po_item_map[code]["warehouse"]
+    })
+    warehouse_is_group = {}
+    if warehouse_names:
+        warehouse_is_group = {
+            wh.name: wh.is_group
+            for wh in frappe.get_all(
+                "Warehouse",
+                filters={"name": ("in", warehouse_names)},
+                fields=["name", "is_group"],
+            )
+        }
+
+    # Collect PR Items & PR Items Detail as plain rows
+    items_rows = []
+    detail_rows = []
     for item_code, item_list in items_grouped.items():
         
         po_item = po_item_map[item_code]
@@ -329,15 +344,11 @@ def _set_purchase_receipt_items_and_details(pr, po_item_map, items_grouped):
         amount = quantity * rate
         total_qty += quantity
         total_amount += amount
-        warehouse = None
 
-        # Validate and assign warehouse
-        if po_item["warehouse"]:
-            wh = frappe.get_value("Warehouse", po_item["warehouse"], ["name", "is_group"])
-            if wh and not wh[1]:  # is_group == 0
-                warehouse = wh[0]
+        # Validate and assign warehouse (only non-group warehouses)
+        warehouse = po_item["warehouse"] if warehouse_is_group.get(po_item["warehouse"]) == 0 else None
         
-        pr.append("items", {
+        items_rows.append({
             "item_code": item_code,
             "qty": quantity,
             "rate": rate,
@@ -347,99 +358,89 @@ def _set_purchase_receipt_items_and_details(pr, po_item_map, items_grouped):
             "warehouse": warehouse
         })
         
-        # Set PR Items Detail
-        for item in item_list:
-            part = item.get("part", "")
-            note = item.get("note", "")
-            serial = item.get("serial", "")
-            serial2 = item.get("serial2", "")
-            sim_serial = item.get("sim_serial", "")
-            device_type = item.get("device_type", "")
-
-            pr.append("custom_item_details", {
+        detail_rows.extend(
+            {
                 "device_requested": item_code,
-                "device_serial": serial,
-                "device_serial_2": serial2,
-                "sim_serial": sim_serial,
-                "device_type": device_type,
-                "part": part,
-                "note": note
-            })
+                "device_serial": item.get("serial", ""),
+                "device_serial_2": item.get("serial2", ""),
+                "sim_serial": item.get("sim_serial", ""),
+                "device_type": item.get("device_type", ""),
+                "part": item.get("part", ""),
+                "note": item.get("note", "")
+            }
+            for item in item_list
+        )
+
+    # Attach rows to the PR; they are written by pr.save() so the
+    # Purchase Receipt controller still validates and submits them
+    pr.extend("items", items_rows)
+    pr.extend("custom_item_details", detail_rows)
     
     pr.total_qty = total_qty
     pr.total = total_amount
     return pr
 
-def _get_po_item_quantity_sum(po_id):
-    return frappe.db.sql("""
-        SELECT SUM(qty) 
-        FROM `tabPurchase Order Item` 
-        WHERE parent = %s
-    """, (po_id,), as_list=1)[0][0] or 0
-    
-def _get_primary_address(link_doctype, link_name):
-    
+_ADDRESS_FIELDS = (
+    "address_line1",
+    "address_line2",
+    "city",
+    "county",
+    "state",
+    "country",
+    "pincode",
+    "email_id",
+    "phone",
+    "fax",
+)
+
+def _get_primary_addresses(pairs):
+    """
+    Fetch the first address linked to each (link_doctype, link_name) pair
+    in a single query.
+
+    Returns:
+        dict: {(link_doctype, link_name): address dict}; pairs without an
+        address are omitted.
+    """
+    pairs = [(dt, dn) for dt, dn in pairs if dt and dn]
+    if not pairs:
+        return {}
+
     address_rows = frappe.get_list(
-        "Address",                     
-        filters={
-            "link_doctype": link_doctype,
-            "link_name": link_name,
-        },
+        "Address",
+        filters=[
+            ["Dynamic Link", "link_doctype", "in", list({dt for dt, _dn in pairs})],
+            ["Dynamic Link", "link_name", "in", list({dn for _dt, dn in pairs})],
+        ],
         fields=[
             "name",
-            "address_line1",
-            "address_line2",
-            "city",
-            "county",
-            "state",
-            "country",
-            "pincode",
-            "email_id",
-            "phone",
-            "fax",
+            "`tabDynamic Link`.link_doctype as link_doctype",
+            "`tabDynamic Link`.link_name as link_name",
+            *_ADDRESS_FIELDS,
         ],
-        limit=1,
     )
 
-    address_info = address_rows[0] if address_rows else None
-
-    if address_info:
-        return {
-            "address_line1": address_info['address_line1'],
-            "address_line2": address_info['address_line2'],
-            "city": address_info['city'],
-            "county": address_info['county'],
-            "state": address_info['state'],
-            "country": address_info['country'],
-            "pincode": address_info['pincode'],
-            "email_id": address_info['email_id'],
-            "phone": address_info['phone'],
-            "fax": address_info['fax'],
-        }
-    return None
-
-def _get_purchase_order_item_details(po):
-
-    # Dictionary to accumulate quantities per item_code
-    item_map = {}
-    total_qty = 0
+    wanted = set(pairs)
+    addresses = {}
+    for row in address_rows:
+        key = (row.link_doctype, row.link_name)
+        if key in wanted and key not in addresses:
+            addresses[key] = {field: row[field] for field in _ADDRESS_FIELDS}
+    return addresses
 
-    for item in po.items:
-        if item.item_code in item_map:
-            # add up quantity if already exists
-            item_map[item.item_code]["qty"] += int(item.qty)
-        else:
-            # first occurrence, create new entry
-            item_map[item.item_code] = {
-                "item_code": item.item_code,
-                "item_name": item.item_name,
-                "item_type": item.item_group,
-                "qty": int(item.qty),
-            }
-        total_qty += int(item.qty)
+def _po_context(po_id):
+    """
+    Load a Purchase Order together with its ordered and delivered item maps.
 
-    # return as list of dicts
-    return total_qty, list(item_map.values())
+    Returns:
+        tuple: (po, po_item_map, delivered_po_items_grouped); po is None if
+        the Purchase Order does not exist.
+    """
+    po = _get_valid_purchase_order(po_id)
+    if not po:
+        return None, {}, {}
+    _total_qty, po_item_map = _get_po_items_grouped(po)
+    return po, po_item_map, _get_delivered_po_items_grouped(po_id)
 
 
 # ===== Data Access Functions =====
@@ -453,8 +454,8 @@ def _create_delivery_note(data):
 
     should_submit_purchase_receipt = not is_draft
     
-    # Fetch Purchase Order
-    po = _get_valid_purchase_order(po_id)
+    # Fetch Purchase Order with ordered & delivered item maps
+    po, po_item_map, delivered_po_items_grouped = _po_context(po_id)
     if not po:
         return {
             "success": False,
@@ -478,14 +479,8 @@ def _create_delivery_note(data):
     
     # Process Purchase Receipt Items & Items Details
     
-    # Map PO Items by item_code
-    po_item_map = _get_po_items_grouped(po)
-    
     # Group incoming items by item_code
     items_grouped = _group_incoming_items(incoming_items, is_draft)
-
-    # Group already delivered items by item_code
-    delivered_po_items_grouped = _get_delivered_po_items_grouped(po_id)
     
     # Validate incoming quantity vs PO qty
     is_fully_fulfilled = _validate_incoming_quantity_against_po(po_id, po_item_map, items_grouped, delivered_po_items_grouped)
@@ -498,7 +493,8 @@ def _create_delivery_note(data):
         pr.save()
         pr.submit()
         
-        # Update PO status
+        # Update PO status; reload first, since the PR submission updates the PO
+        # and its items (received_qty), which po.save() would otherwise overwrite
         po.reload()
         workflow_action = "Fulfill" if is_fully_fulfilled else "Partial"
         handle_workflow(po, workflow_action)
@@ -545,8 +541,8 @@ def _update_delivery_note_items_and_detail(data):
         }
         
     # Fetch Purchase Order
-    po_id = next((item.purchase_order for item in pr.items if item.purchase_order), None)
-    po = _get_valid_purchase_order(po_id)
+    po_id = pr.custom_purchase_order or next((item.purchase_order for item in pr.items if item.purchase_order), None)
+    po, po_item_map, delivered_po_items_grouped = _po_context(po_id)
     if not po:
         return {
             "success": False,
@@ -563,15 +559,9 @@ def _update_delivery_note_items_and_detail(data):
     
     pr.posting_date = nowdate()
     
-    # Map PO Items by item_code
-    po_item_map = _get_po_items_grouped(po)
-    
     # Group incoming items by item_code
     items_grouped = _group_incoming_items(incoming_items, is_draft)
     
-    # Group already delivered items by item_code
-    delivered_po_items_grouped = _get_delivered_po_items_grouped(po_id)
-    
     # Validate incoming quantity vs PO qty
     is_fully_fulfilled = _validate_incoming_quantity_against_po(po_id, po_item_map, items_grouped, delivered_po_items_grouped)
     
@@ -585,7 +575,8 @@ def _update_delivery_note_items_and_detail(data):
         pr.save()
         pr.submit()
         
-        # Update PO status
+        # Update PO status; reload first, since the PR submission updates the PO
+        # and its items (received_qty), which po.save() would otherwise overwrite
         po.reload()
         workflow_action = "Fulfill" if is_fully_fulfilled else "Partial"
         handle_workflow(po, workflow_action)
@@ -609,10 +600,10 @@ def _update_delivery_note_items_and_detail(data):
 @auth_required()
 def _get_delivery_notes_list(filters, start, page_size):
     
-    # Fetch receipts
-    receipts = frappe.get_list(
+    # Fetch the page of receipts and the total count in one permission-aware query
+    receipts, total_count = get_list_page_with_total(
         "Purchase Receipt",
-        filters=filters,
+        filters,
         fields=[
             "name as note_id",
             "posting_date as date_of_dispatch",
@@ -620,33 +611,29 @@ def _get_delivery_notes_list(filters, start, page_size):
             "workflow_state as status",
         ],
         order_by="posting_date desc",
-        page_length=page_size,
-        start=start
+        start=start,
+        page_size=page_size
     )
 
     if not receipts:
-        return {"delivery_notes_list": receipts, "total_delivery_notes": 0}
+        return {"delivery_notes_list": receipts, "total_delivery_notes": total_count}
 
     # Aggregate item quantities per receipt
-    receipt_details = [frappe.get_doc("Purchase Receipt", receipt.note_id) for receipt in receipts]
-    
-    item_map = {}
-    for detail in receipt_details:
-        for item in detail.items:
-            pr_item = item.as_dict()
-            qty = int(pr_item.qty)
-            if detail.name in item_map:
-                item_map[detail.name] += qty
-            else:
-                item_map[detail.name] = qty
+    note_ids = [r.note_id for r in receipts]
+    rows = frappe.get_all(
+        "Purchase Receipt Item",
+        filters={"parent": ("in", note_ids)},
+        fields=["parent", "qty"],
+    )
+
+    item_map = defaultdict(int)
+    for row in rows:
+        item_map[row.parent] += int(row.qty)
 
     # Merge into receipts
     for r in receipts:
-        r["total_items"] = int(item_map.get(r["note_id"], 0))
+        r["total_items"] = item_map.get(r["note_id"], 0)
 
-    # Total count
-    total_count = frappe.db.count("Purchase Receipt", filters=filters)
-    
     return {
         "delivery_notes_list": receipts,
         "total_delivery_notes": total_count
@@ -656,10 +643,50 @@ def _get_delivery_notes_list(filters, start, page_size):
 @sanitize_request
 def _get_delivery_note_detail(note_id):
     
-    # Get Purchase Receipt
-    try:
-        pr = frappe.get_doc("Purchase Receipt", note_id)
-    except frappe.DoesNotExistError:
+    # Serve from cache while the Purchase Receipt is unchanged; `modified` is
+    # part of the key, so any update to the note starts a fresh entry
+    modified = frappe.db.get_value("Purchase Receipt", note_id, "modified")
+    cache_key = f"dn_detail:{note_id}:{modified}"
+    if modified:
+        cached = frappe.cache().get_value(cache_key)
+        if cached:
+            return cached
+    
+    delivery_note_detail = _build_delivery_note_detail(note_id)
+    if modified and delivery_note_detail.get("success"):
+        frappe.cache().set_value(cache_key, delivery_note_detail, expires_in_sec=DELIVERY_NOTE_DETAIL_CACHE_TTL)
+    
+    return delivery_note_detail
+
+def clear_delivery_note_detail_cache(doc, method=None):
+    """
+    Drop cached delivery note details (doc_events hook).
+
+    A Purchase Receipt change can move the delivered totals shown on every note
+    of its Purchase Order, so all entries are dropped; an attachment (File or
+    Document Upload) only affects the note it belongs to.
+    """
+    if doc.doctype == "Purchase Receipt":
+        frappe.cache().delete_keys("dn_detail:")
+        return
+
+    if doc.doctype == "File":
+        doctype, note_id = doc.get("attached_to_doctype"), doc.get("attached_to_name")
+    else:
+        doctype, note_id = doc.get("document_category"), doc.get("document_id")
+    if doctype == "Purchase Receipt" and note_id:
+        frappe.cache().delete_keys(f"dn_detail:{note_id}:")
+
+def _build_delivery_note_detail(note_id):
+    
+    # Get Purchase Receipt (read-only, so skip the full document load)
+    pr = frappe.db.get_value(
+        "Purchase Receipt",
+        note_id,
+        ["name", "supplier", "company", "posting_date", "workflow_state", "custom_purchase_order"],
+        as_dict=True,
+    )
+    if not pr:
         return {
             "success": False,
             "message": f"Delivery Note not found.",
@@ -667,53 +694,82 @@ def _get_delivery_note_detail(note_id):
         }
     
     # Verify Purchase Order for Purchase Receipt   
-    po_id = next((item.purchase_order for item in pr.items if item.purchase_order), None)
+    po_id = pr.custom_purchase_order or next(iter(frappe.get_all(
+        "Purchase Receipt Item",
+        filters={"parent": note_id, "parenttype": "Purchase Receipt", "purchase_order": ("is", "set")},
+        order_by="idx asc",
+        limit=1,
+        pluck="purchase_order",
+    )), None)
     if not po_id:
         return {
             "success": False,
             "message": f"No linked Purchase Order found for this Delivery Note.",
             "status_code": 404,
         }
-    try:
-        po = frappe.get_doc("Purchase Order", po_id)
-    except frappe.DoesNotExistError:
+    
+    # Check the Purchase Order and read its items in one query
+    po_rows = frappe.db.sql("""
+        SELECT poi.item_code, poi.item_name, poi.item_group, poi.qty,
+            poi.parent, poi.rate, poi.uom, poi.warehouse
+        FROM `tabPurchase Order` po
+        LEFT JOIN `tabPurchase Order Item` poi
+            ON poi.parent = po.name AND poi.parenttype = 'Purchase Order'
+        WHERE po.name = %s
+        ORDER BY poi.idx
+    """, (po_id,), as_dict=1)
+    if not po_rows:
         return {
             "success": False,
             "message": f"Purchase Order not found.",
             "status_code": 404,
         }
+    po_items = [row for row in po_rows if row.parent]
     
     # Format the Ordere Items details & Delivered Items details
-    total_ordered_items, po_items_detail = _get_purchase_order_item_details(po)
-    total_delivered_items, delivered_items_detail = _get_delivered_items_detail(po_id)
+    total_ordered_items, po_item_map = _get_po_items_grouped(_dict(items=po_items))
+    po_items_detail = [
+        {
+            "item_code": item["item_code"],
+            "item_name": item["item_name"],
+            "item_type": item["item_type"],
+            "qty": item["qty"],
+        }
+        for item in po_item_map.values()
+    ]
+    total_delivered_items, delivered_items_detail = _get_delivered_items_detail(
+        _get_delivered_po_items_grouped(po_id)
+    )
     
     # Get Purchase Receipt Attachments
     attachments = get_uploaded_documents("Purchase Receipt", note_id)
     
     # Format County & Supplier address
-    county_address = _get_primary_address("Company", pr.company)
-    supplier_address = _get_primary_address("Supplier", pr.supplier)
+    addresses = _get_primary_addresses([("Company", pr.company), ("Supplier", pr.supplier)])
+    county_address = addresses.get(("Company", pr.company))
+    supplier_address = addresses.get(("Supplier", pr.supplier))
     
     # Prepare Delivery Note Items data with device details
-    item_list = Counter()
-    items_detail = []
-    total_qty = 0
-    if pr.custom_item_details:
-        for row in pr.custom_item_details:
-            item_list[row.device_requested] += 1
-                
-            items_detail.append(
-                {
-                    "item_code": row.device_requested,
-                    "serial": row.device_serial,
-                    "serial2": row.device_serial_2,
-                    "sim_serial": row.sim_serial,
-                    "device_type": row.device_type,
-                    "part": row.part,
-                    "note": row.note,
-                }
-            )
-            total_qty += 1
+    custom_item_details = frappe.get_all(
+        frappe.get_meta("Purchase Receipt").get_field("custom_item_details").options,
+        filters={"parent": note_id, "parenttype": "Purchase Receipt", "parentfield": "custom_item_details"},
+        fields=["device_requested", "device_serial", "device_serial_2", "sim_serial", "device_type", "part", "note"],
+        order_by="idx asc",
+    )
+    item_list = Counter(row.device_requested for row in custom_item_details)
+    total_qty = len(custom_item_details)
+    items_detail = [
+        {
+            "item_code": row.device_requested,
+            "serial": row.device_serial,
+            "serial2": row.device_serial_2,
+            "sim_serial": row.sim_serial,
+            "device_type": row.device_type,
+            "part": row.part,
+            "note": row.note,
+        }
+        for row in custom_item_details
+    ]
         
     return {
         "success": True,
@@ -776,6 +832,7 @@ def _handle_delivery_note_workflow(note_id):
 # ===== API Functions =====
 
 @frappe.whitelist(methods=['POST'])
+@api_errors("Delivery Note Creation Failed", "Failed to create Delivery Note", format_validation_error=_validation_error_message)
 def create_delivery_note(**kwargs):
     """
     Create Delivery Note from given items for a specific Purchase Order.
@@ -789,52 +846,32 @@ def create_delivery_note(**kwargs):
         dict: API response with success status and delivery note name
     """
     
-    try:
-        expected_data = ["po_id", "is_draft", "items"]
-        required_data = [("po_id", "Purchase Order ID"), ("is_draft", "Draft Status"), ("items", "Items List")]
-
-        request_data = _read_query_params(kwargs, expected_data)
-        _validate_request_data(request_data, required_data)
-        if not isinstance(request_data.get("items"), list):
-            frappe.throw(_("Items ('items') must be a list."), frappe.ValidationError)    
-        if request_data.get("is_draft") not in [1, 0]:
-            frappe.throw(_("Invalid Draft Status ('is_draft') value. Use 1 or 0."), frappe.ValidationError)
-          
-        delivery_note_creation = _create_delivery_note(request_data)
-        if not delivery_note_creation.get("success"):
-            return api_response(success=False, message=delivery_note_creation.get("message"), status_code=delivery_note_creation.get("status_code"))
-            
-        delivery_note = delivery_note_creation.get("data")
-        
-        return api_response(
-            success=True,
-            message=f"Delivery Note '{delivery_note['id']}' created successfully",
-            data={"delivery_note": delivery_note["id"]},
-            status_code=201
-        )
-        
-    except PermissionError as pe:
-        return api_response(success=False, message=str(pe), status_code=403)
-
-    except ValidationError as ve:
-        frappe.db.rollback()
-        frappe.log_error(frappe.get_traceback(), "Delivery Note Creation Failed")
-        msg = str(ve)
-        if isinstance(ve, UniqueValidationError):
-            msg = _format_duplicate_entry_validation_msg(msg)
-                
-        return api_response(success=False, message=msg, status_code=400)
+    expected_data = ["po_id", "is_draft", "items"]
+    required_data = [("po_id", "Purchase Order ID"), ("is_draft", "Draft Status"), ("items", "Items List")]
 
-    except AuthError as ae:
-        return api_response(success=False, message=ae.message, status_code=ae.status_code)
-    
-    except Exception as e:
-        frappe.db.rollback()
-        frappe.log_error(frappe.get_traceback(), "Delivery Note Creation Failed")
-        return api_response(success=False, message="Failed to create Delivery Note", status_code=500)
+    request_data = _read_query_params(kwargs, expected_data)
+    _validate_request_data(request_data, required_data)
+    if not isinstance(request_data.get("items"), list):
+        frappe.throw(_("Items ('items') must be a list."), frappe.ValidationError)    
+    if request_data.get("is_draft") not in [1, 0]:
+        frappe.throw(_("Invalid Draft Status ('is_draft') value. Use 1 or 0."), frappe.ValidationError)
+      
+    delivery_note_creation = _create_delivery_note(request_data)
+    if not delivery_note_creation.get("success"):
+        return api_response(success=False, message=delivery_note_creation.get("message"), status_code=delivery_note_creation.get("status_code"))
+        
+    delivery_note = delivery_note_creation.get("data")
     
+    return api_response(
+        success=True,
+        message=f"Delivery Note '{delivery_note['id']}' created successfully",
+        data={"delivery_note": delivery_note["id"]},
+        status_code=201
+    )
+
 
 @frappe.whitelist(methods=['PUT'])
+@api_errors("Delivery Note Updation Failed", "Failed to update Delivery Note", format_validation_error=_validation_error_message)
 def update_delivery_note_items_and_detail(**kwargs):
     """
     Update Delivery Note from given device details.
@@ -848,53 +885,32 @@ def update_delivery_note_items_and_detail(**kwargs):
         dict: API response with success status and delivery note name
     """
     
-    try:
-        
-        expected_data = ["dn_id", "is_draft", "items"]
-        required_data = [("dn_id", "Delivery Note ID"), ("is_draft", "Draft Status"), ("items", "Items List")]
+    expected_data = ["dn_id", "is_draft", "items"]
+    required_data = [("dn_id", "Delivery Note ID"), ("is_draft", "Draft Status"), ("items", "Items List")]
+    
+    request_data = _read_query_params(kwargs, expected_data)
+    _validate_request_data(request_data, required_data)
+    if not isinstance(request_data.get("items"), list):
+        frappe.throw(_("Items ('items') must be a list."), frappe.ValidationError)    
+    if request_data.get("is_draft") not in [1, 0]:
+        frappe.throw(_("Invalid Draft Status ('is_draft') value. Use 1 or 0."), frappe.ValidationError)
         
-        request_data = _read_query_params(kwargs, expected_data)
-        _validate_request_data(request_data, required_data)
-        if not isinstance(request_data.get("items"), list):
-            frappe.throw(_("Items ('items') must be a list."), frappe.ValidationError)    
-        if request_data.get("is_draft") not in [1, 0]:
-            frappe.throw(_("Invalid Draft Status ('is_draft') value. Use 1 or 0."), frappe.ValidationError)
-            
-        delivery_note_creation = _update_delivery_note_items_and_detail(request_data)
-        if not delivery_note_creation.get("success"):
-            return api_response(success=False, message=delivery_note_creation.get("message"), status_code=delivery_note_creation.get("status_code"))
-            
-        delivery_note = delivery_note_creation.get("data")
+    delivery_note_creation = _update_delivery_note_items_and_detail(request_data)
+    if not delivery_note_creation.get("success"):
+        return api_response(success=False, message=delivery_note_creation.get("message"), status_code=delivery_note_creation.get("status_code"))
         
-        return api_response(
-            success=True,
-            message=f"Delivery Note '{delivery_note['id']}' updated successfully",
-            data={"delivery_note": {delivery_note["id"]}},
-            status_code=201
-        )
+    delivery_note = delivery_note_creation.get("data")
     
-    except PermissionError as pe:
-        return api_response(success=False, message=str(pe), status_code=403)
-
-    except ValidationError as ve:
-        frappe.db.rollback()
-        frappe.log_error(frappe.get_traceback(), "Delivery Note Updation Failed")
-        msg = str(ve)
-        if isinstance(ve, UniqueValidationError):
-            msg = _format_duplicate_entry_validation_msg(msg)
+    return api_response(
+        success=True,
+        message=f"Delivery Note '{delivery_note['id']}' updated successfully",
+        data={"delivery_note": {delivery_note["id"]}},
+        status_code=201
+    )
 
-        return api_response(success=False, message=msg, status_code=400)
 
-    except AuthError as ae:
-        return api_response(success=False, message=ae.message, status_code=ae.status_code)
-    
-    except Exception as e:
-        frappe.db.rollback()
-        frappe.log_error(frappe.get_traceback(), "Delivery Note Updation Failed")
-        return api_response(success=False, message="Failed to update Delivery Note", status_code=500)
-      
-        
 @frappe.whitelist(methods=["GET"])
+@api_errors("Fetch Delivery Notes API Error", "Failed to fetch delivery notes.", log_validation_errors=False)
 @sanitize_request
 def fetch_all_delivery_notes(**kwargs):
     """
@@ -922,48 +938,27 @@ def fetch_all_delivery_notes(**kwargs):
             }
         ]
     """
-    try:
-        expected_data = ["filter", "from_date", "to_date", "purchase_order", "county", "search", "limit", "page"]
-        required_data = [("filter", "Filter")]
-        
-        request_data = _read_query_params(kwargs, expected_data)
-        _validate_request_data(request_data, required_data)
-        page_size, start = _build_pagination_params(request_data)
-        delivery_notes_filters = _build_delivery_notes_filter(request_data)
-         
-        delivery_notes_response = _get_delivery_notes_list(delivery_notes_filters, start, page_size)
-        
-        # Return Result
-        return api_response(
-            success=True,
-            data=delivery_notes_response.get("delivery_notes_list"),
-            status_code=200,
-            pagination=_paginate(start, page_size, delivery_notes_response.get("total_delivery_notes"))
-        )
-        
-    except PermissionError as pe:
-        frappe.db.rollback()
-        api_response(success=False, message=str(pe), status_code=403)
-
-    except ValidationError as ve:
-        frappe.db.rollback()
-        return api_response(success=False, message=str(ve), status_code=400)
-
-    except AuthError as ae:
-        return api_response(success=False, message=ae.message, status_code=ae.status_code)
-    
-    except Exception as e:
-        frappe.db.rollback()
-        frappe.log_error(frappe.get_traceback(),
-                         "Fetch Delivery Notes API Error")
-        return api_response(
-            success=False,
-            message=_("Failed to fetch delivery notes."),
-            status_code=500
-        )
+    expected_data = ["filter", "from_date", "to_date", "purchase_order", "county", "search", "limit", "page"]
+    required_data = [("filter", "Filter")]
+    
+    request_data = _read_query_params(kwargs, expected_data)
+    _validate_request_data(request_data, required_data)
+    page_size, start = _build_pagination_params(request_data)
+    delivery_notes_filters = _build_delivery_notes_filter(request_data)
+     
+    delivery_notes_response = _get_delivery_notes_list(delivery_notes_filters, start, page_size)
+    
+    # Return Result
+    return api_response(
+        success=True,
+        data=delivery_notes_response.get("delivery_notes_list"),
+        status_code=200,
+        pagination=_paginate(start, page_size, delivery_notes_response.get("total_delivery_notes"))
+    )
 
 
 @frappe.whitelist(methods=["GET"])
+@api_errors("Fetch Delivery Note API Error", "Failed to fetch delivery note due to an unexpected error.", log_validation_errors=False)
 @sanitize_request
 def fetch_delivery_note(note_id: str = None):
     """
@@ -1021,97 +1016,58 @@ def fetch_delivery_note(note_id: str = None):
             "attachment": []
         }
     """
-    try:
-        required_data = [("note_id", "Delivery Note ID")]
-        _validate_request_data({"note_id": note_id}, required_data)
-        
-        delivery_note_info = _get_delivery_note_detail(note_id)
-        if not delivery_note_info.get("success"):
-            return api_response(success=False, message=delivery_note_info.get("message"), status_code=delivery_note_info.get("status_code"))
-            
-        delivery_note_detail = delivery_note_info.get("data")
-        
+    required_data = [("note_id", "Delivery Note ID")]
+    _validate_request_data({"note_id": note_id}, required_data)
+    
+    delivery_note_info = _get_delivery_note_detail(note_id)
+    if not delivery_note_info.get("success"):
+        return api_response(success=False, message=delivery_note_info.get("message"), status_code=delivery_note_info.get("status_code"))
         
-        # Prepare response
-        data = {
-            "note_id":              delivery_note_detail["note_id"],
-            "po_id":                delivery_note_detail["po_id"],
-            "posting_date":         delivery_note_detail["posting_date"],
-            "supplier":             delivery_note_detail["supplier"],
-            "supplier_address":     delivery_note_detail["supplier_address"],
-            "county":               delivery_note_detail["county"],
-            "county_address":       delivery_note_detail["county_address"],            
-            "status":               delivery_note_detail["status"],
-            "total_ordered_items":  delivery_note_detail["total_ordered_items"],
-            "total_items":          delivery_note_detail["total_items"],
-            "total_delivered_items": delivery_note_detail["total_delivered_items"],
-            "items_list":           delivery_note_detail["items_list"],
-            "items_detail":         delivery_note_detail["items_detail"],
-            "po_items_detail":      delivery_note_detail["po_items_detail"],
-            "delivered_items_detail": delivery_note_detail["delivered_items_detail"],
-            "attachment":           delivery_note_detail["attachment"]
-        }
+    delivery_note_detail = delivery_note_info.get("data")
+    
+    
+    # Prepare response
+    data = {
+        "note_id":              delivery_note_detail["note_id"],
+        "po_id":                delivery_note_detail["po_id"],
+        "posting_date":         delivery_note_detail["posting_date"],
+        "supplier":             delivery_note_detail["supplier"],
+        "supplier_address":     delivery_note_detail["supplier_address"],
+        "county":               delivery_note_detail["county"],
+        "county_address":       delivery_note_detail["county_address"],            
+        "status":               delivery_note_detail["status"],
+        "total_ordered_items":  delivery_note_detail["total_ordered_items"],
+        "total_items":          delivery_note_detail["total_items"],
+        "total_delivered_items": delivery_note_detail["total_delivered_items"],
+        "items_list":           delivery_note_detail["items_list"],
+        "items_detail":         delivery_note_detail["items_detail"],
+        "po_items_detail":      delivery_note_detail["po_items_detail"],
+        "delivered_items_detail": delivery_note_detail["delivered_items_detail"],
+        "attachment":           delivery_note_detail["attachment"]
+    }
 
-        return api_response(success=True, data=data, status_code=200)
-
-        
-    except PermissionError as pe:
-        return api_response(success=False, message=str(pe), status_code=403)
-    
-    except ValidationError as ve:
-        return api_response(success=False, message=str(ve), status_code=400)
-
-    except AuthError as ae:
-        return api_response(success=False, message=ae.message, status_code=ae.status_code)
-    
-    except Exception as e:
-        frappe.log_error(frappe.get_traceback(), "Fetch Delivery Note API Error")
-        return api_response(
-            success=False,
-            message="Failed to fetch delivery note due to an unexpected error.",
-            status_code=500,
-        )
+    return api_response(success=True, data=data, status_code=200)
 
 
 @frappe.whitelist(methods=["PUT"])
+@api_errors("Deliver Note Acknowledgment Error", "Failed to acknowledge Delivery Note due to an internal error.", log_validation_errors=False)
 def delivery_notes_workflow_states_handler(note_id: str = None):
     """
     Delivery Notes workflow states handler.
     """
-    try:
-        required_data = [("note_id", "Delivery Note ID")]
-        request_data = {"note_id": note_id}
-        _validate_request_data(request_data, required_data)
-    
-        workflow_info = _handle_delivery_note_workflow(note_id)
-        if not workflow_info.get("success"):
-            return api_response(success=False, message=workflow_info.get("message"), status_code=workflow_info.get("status_code"))
-        
-        return api_response(
-                success=True,
-                message="Delivery note acknowledged successfully.",
-                data={
-                    "note_id": note_id
-                },
-                status_code=200
-            )
-
-    except PermissionError as pe:
-        frappe.db.rollback()
-        return api_response(success=False, message=str(pe), status_code=403)
-    
-    except ValidationError as ve:
-        frappe.db.rollback()
-        return api_response(success=False, message=str(ve), status_code=400)
-    
-    except AuthError as ae:
-        return api_response(success=False, message=ae.message, status_code=ae.status_code)
-    
-    except Exception as e:
-        frappe.db.rollback()
-        frappe.log_error(frappe.get_traceback(), "Deliver Note Acknowledgment Error")
-        return api_response(
-            success=False,
-            message="Failed to acknowledge Delivery Note due to an internal error.",
-            status_code=500
-        )
+    required_data = [("note_id", "Delivery Note ID")]
+    request_data = {"note_id": note_id}
+    _validate_request_data(request_data, required_data)
+
+    workflow_info = _handle_delivery_note_workflow(note_id)
+    if not workflow_info.get("success"):
+        return api_response(success=False, message=workflow_info.get("message"), status_code=workflow_info.get("status_code"))
+    
+    return api_response(
+        success=True,
+        message="Delivery note acknowledged successfully.",
+        data={
+            "note_id": note_id
+        },
+        status_code=200
+    )
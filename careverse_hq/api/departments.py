@@ -1,12 +1,14 @@
 import frappe, re
 from typing import Any, Dict
-from .utils import api_response, sanitize_request
-from healthpro_erp.healthpro_erp.decorators.permissions import auth_required, AuthError
+from .utils import api_response, api_errors, sanitize_request, get_list_page_with_total
+from healthpro_erp.healthpro_erp.decorators.permissions import auth_required
+
+_DUP_RE = re.compile(r"Duplicate entry '([^']+)' for key '([^']+)'")
 
 # ===== Helper Functions =====
 
 def _format_duplicate_entry_validation_msg(error_msg):
-    m = re.search(r"Duplicate entry '([^']+)' for key '([^']+)'", error_msg)
+    m = _DUP_RE.search(error_msg)
     if m:
         dup_value, dup_field = m.groups()
         field_label = dup_field.replace("_", " ").title()
@@ -84,6 +86,27 @@ def _build_department_filter(params):
         filters.append(["parent_department", "like", "%{}%".format(params["facility_id"])])
 
     return filters
+
+def _get_facility_department(facility_id):
+    """
+    Return the Department (name, company) that represents the given Health
+    Facility, looked up by its `custom_health_facility` link.
+
+    Raises:
+        frappe.ValidationError: If the facility is not configured as a Department.
+    """
+    facility_department = frappe.db.get_value(
+        "Department",
+        {"custom_health_facility": facility_id, "custom_is_health_facility": 1},
+        ["name", "company"],
+        as_dict=True,
+    )
+
+    if not facility_department:
+        raise frappe.ValidationError(
+            "Health Facility '{}' is not configured as Department".format(facility_id)
+        )
+    return facility_department
    
 # ===== Data Access Functions =====
 
@@ -94,27 +117,15 @@ def _create_department(data):
     facility_id = data.get("facility_id")
     
     # Make sure Health Facility exists
-    try:
-        health_facility = frappe.get_doc("Health Facility", facility_id)
-    except frappe.DoesNotExistError as de:
+    if not frappe.db.exists("Health Facility", facility_id):
         raise frappe.ValidationError(
             "No Health Facility found with facility id: '{}'".format(facility_id)
         )
     
     # Make sure Health Facility is configured as Department
-    facility_department = frappe.db.get_list(
-        "Department",
-        filters={"name": ["like", "%{}%".format(facility_id)]},
-        fields=["name", "company"],
-        limit=1,
-    )
-
-    if not facility_department:
-        raise frappe.ValidationError(
-            "Health Facility '{}' is not configured as Department".format(facility_id)
-        )
-    parent_department = facility_department[0].name
-    company = facility_department[0].company
+    facility_department = _get_facility_department(facility_id)
+    parent_department = facility_department.name
+    company = facility_department.company
         
     # Create Department
     department_doc = frappe.new_doc("Department")
@@ -151,27 +162,15 @@ def _update_department(data):
         
     if facility_id:    
         # Make sure Health Facility exists
-        try:
-            health_facility = frappe.get_doc("Health Facility", facility_id)
-        except frappe.DoesNotExistError as de:
+        if not frappe.db.exists("Health Facility", facility_id):
             raise frappe.ValidationError(
                 "No Health Facility found with facility id: '{}'".format(facility_id)
             )
     
         # Make sure Health Facility is configured as Department
-        facility_department = frappe.db.get_list(
-            "Department",
-            filters={"name": ["like", "%{}%".format(facility_id)]},
-            fields=["name", "company"],
-            limit=1,
-        )
-
-        if not facility_department:
-            raise frappe.ValidationError(
-                "Health Facility '{}' is not configured as Department".format(facility_id)
-            )
-        parent_department = facility_department[0].name
-        company = facility_department[0].company
+        facility_department = _get_facility_department(facility_id)
+        parent_department = facility_department.name
+        company = facility_department.company
         
         department.parent_department = parent_department
         department.company = company
@@ -189,10 +188,10 @@ def _fetch_departments(department_filters, start, page_size):
         ["custom_is_health_facility", "=", "0"]
     )
     
-    # Fetch departments
-    departments = frappe.get_list(
+    # Fetch the page and the total count in one permission-aware query
+    departments, department_count = get_list_page_with_total(
         "Department",
-        filters=department_filters,
+        department_filters,
         fields=[
             "name as department_id",
             "department_name",
@@ -200,15 +199,9 @@ def _fetch_departments(department_filters, start, page_size):
             "company"
         ],
         order_by="creation desc",
-        page_length=page_size,
-        start=start
+        start=start,
+        page_size=page_size
     )
-    
-    if not departments:
-        return {"department_list": departments, "total_departments": 0}
-    
-    # Total count
-    department_count = frappe.db.count("Department", filters=department_filters)
 
     return {
         "department_list": departments,
@@ -233,6 +226,7 @@ def _delete_department(data):
 # ===== API Functions =====
 
 @frappe.whitelist(methods=['POST'])
+@api_errors("Department Creation Failed", "Failed to create Department")
 def create_department(**kwargs):
     """
     Create Department using request payload.
@@ -254,42 +248,28 @@ def create_department(**kwargs):
             "message": "Department 'abc123' created successfully"
         }
     """
-    try:
-        expected_data = ["department_name", "facility_id"]
-        required_data = [("department_name", "Department Name"), ("facility_id", "Facility ID")]
+    expected_data = ["department_name", "facility_id"]
+    required_data = [("department_name", "Department Name"), ("facility_id", "Facility ID")]
 
-        request_data = _read_query_params(kwargs, expected_data)
-        _validate_request_data(request_data, required_data)
-        
-        department_creation = _create_department(request_data)
-
-        return api_response(
-            success=True,
-            message="Department '{}' created successfully".format(department_creation.department_name),
-            data={
-                "department_id": department_creation.name,
-                "department_name": department_creation.department_name,
-                "parent_department": department_creation.parent_department,
-                "company": department_creation.company
-            },
-            status_code=201
-        )
-        
-    except PermissionError as pe:
-        return api_response(success=False, message=str(pe), status_code=403)
-
-    except frappe.ValidationError as ve:
-        frappe.log_error(frappe.get_traceback(), "Department Creation Failed")                
-        return api_response(success=False, message=str(ve), status_code=400)
-
-    except AuthError as ae:
-        return api_response(success=False, message=ae.message, status_code=ae.status_code)
+    request_data = _read_query_params(kwargs, expected_data)
+    _validate_request_data(request_data, required_data)
     
-    except Exception as e:
-        frappe.log_error(frappe.get_traceback(), "Department Creation Failed")
-        return api_response(success=False, message="Failed to create Department", status_code=500)
+    department_creation = _create_department(request_data)
+
+    return api_response(
+        success=True,
+        message="Department '{}' created successfully".format(department_creation.department_name),
+        data={
+            "department_id": department_creation.name,
+            "department_name": department_creation.department_name,
+            "parent_department": department_creation.parent_department,
+            "company": department_creation.company
+        },
+        status_code=201
+    )
 
 @frappe.whitelist(methods=['PUT'])
+@api_errors("Department Updation Failed", "Failed to update Department")
 def update_department(**kwargs):
     """
     Update Department using request payload.
@@ -312,42 +292,28 @@ def update_department(**kwargs):
             "message": "Department 'abc - N' updated successfully"
         }
     """
-    try:
-        expected_data = ["department_id", "department_name", "facility_id"]
-        required_data = [("department_id", "Department ID")]
-
-        request_data = _read_query_params(kwargs, expected_data)
-        _validate_request_data(request_data, required_data)
-        
-        department_updation = _update_department(request_data)
-        
-        return api_response(
-            success=True,
-            message="Department '{}' updated successfully".format(department_updation.name),
-            data={
-                "department_id": department_updation.name,
-                "department_name": department_updation.department_name,
-                "parent_department": department_updation.parent_department,
-                "company": department_updation.company
-            },
-            status_code=200
-        )
-        
-    except PermissionError as pe:
-        return api_response(success=False, message=str(pe), status_code=403)
+    expected_data = ["department_id", "department_name", "facility_id"]
+    required_data = [("department_id", "Department ID")]
 
-    except frappe.ValidationError as ve:
-        frappe.log_error(frappe.get_traceback(), "Department Updation Failed")                
-        return api_response(success=False, message=str(ve), status_code=400)
-
-    except AuthError as ae:
-        return api_response(success=False, message=ae.message, status_code=ae.status_code)
+    request_data = _read_query_params(kwargs, expected_data)
+    _validate_request_data(request_data, required_data)
+    
+    department_updation = _update_department(request_data)
     
-    except Exception as e:
-        frappe.log_error(frappe.get_traceback(), "Department Updation Failed")
-        return api_response(success=False, message="Failed to update Department", status_code=500)
+    return api_response(
+        success=True,
+        message="Department '{}' updated successfully".format(department_updation.name),
+        data={
+            "department_id": department_updation.name,
+            "department_name": department_updation.department_name,
+            "parent_department": department_updation.parent_department,
+            "company": department_updation.company
+        },
+        status_code=200
+    )
 
 @frappe.whitelist(methods=['GET'])
+@api_errors("Department fetch Failed", "Failed to fetch Department")
 @sanitize_request
 def fetch_departments(**kwargs):
     """
@@ -377,37 +343,23 @@ def fetch_departments(**kwargs):
             }
         }
     """
-    try:
-        expected_data = ["department_name", "facility_id", "limit", "page"]
-
-        request_data = _read_query_params(kwargs, expected_data)
-        page_size, start = _build_pagination_params(request_data)
-        department_filters = _build_department_filter(request_data)
-        
-        departments_response = _fetch_departments(department_filters, start, page_size)
-        
-        return api_response(
-            success=True,
-            data=departments_response.get("department_list"),
-            status_code=200,
-            pagination=_paginate(start, page_size, departments_response.get("total_departments"))
-        )
-        
-    except PermissionError as pe:
-        return api_response(success=False, message=str(pe), status_code=403)
-
-    except frappe.ValidationError as ve:
-        frappe.log_error(frappe.get_traceback(), "Department fetch Failed")                
-        return api_response(success=False, message=str(ve), status_code=400)
+    expected_data = ["department_name", "facility_id", "limit", "page"]
 
-    except AuthError as ae:
-        return api_response(success=False, message=ae.message, status_code=ae.status_code)
+    request_data = _read_query_params(kwargs, expected_data)
+    page_size, start = _build_pagination_params(request_data)
+    department_filters = _build_department_filter(request_data)
     
-    except Exception as e:
-        frappe.log_error(frappe.get_traceback(), "Department fetch Failed")
-        return api_response(success=False, message="Failed to fetch Department", status_code=500)
+    departments_response = _fetch_departments(department_filters, start, page_size)
+    
+    return api_response(
+        success=True,
+        data=departments_response.get("department_list"),
+        status_code=200,
+        pagination=_paginate(start, page_size, departments_response.get("total_departments"))
+    )
 
 @frappe.whitelist(methods=['DELETE'])
+@api_errors("Department deletion Failed", "Failed to delete Department")
 def delete_department(**kwargs):
     """
     Delete Department using department id.
@@ -425,34 +377,19 @@ def delete_department(**kwargs):
             "message": "Department 'abc123 - N' deleted successfully"
         }
     """
-    try:
-        expected_data = ["department_id"]
-        required_data = [("department_id", "Department ID")]
-
-        request_data = _read_query_params(kwargs, expected_data)
-        _validate_request_data(request_data, required_data)
-        
-        department_id = _delete_department(request_data)
-        
-        return api_response(
-            success=True,
-            message="Department '{}' deleted successfully".format(department_id),
-            data={
-                "department_id": department_id
-            },
-            status_code=200
-        )
-        
-    except PermissionError as pe:
-        return api_response(success=False, message=str(pe), status_code=403)
-
-    except frappe.ValidationError as ve:
-        frappe.log_error(frappe.get_traceback(), "Department deletion Failed")                
-        return api_response(success=False, message=str(ve), status_code=400)
+    expected_data = ["department_id"]
+    required_data = [("department_id", "Department ID")]
 
-    except AuthError as ae:
-        return api_response(success=False, message=ae.message, status_code=ae.status_code)
+    request_data = _read_query_params(kwargs, expected_data)
+    _validate_request_data(request_data, required_data)
     
-    except Exception as e:
-        frappe.log_error(frappe.get_traceback(), "Department deletion Failed")
-        return api_response(success=False, message="Failed to delete Department", status_code=500)
\ No newline at end of file
+    department_id = _delete_department(request_data)
+    
+    return api_response(
+        success=True,
+        message="Department '{}' deleted successfully".format(department_id),
+        data={
+            "department_id": department_id
+        },
+        status_code=200
+    )
@@ -1,36 +1,72 @@
+import hashlib
+import io
+
 import pandas as pd
 import frappe
 
 DEFAULT_DATE = "1990-01-01"
 DEFAULT_DATE_1 = "1991-01-01"
+DEVICE_INSERT_BATCH_SIZE = 500
+# Rows are sharded by ID No. and each shard is one job, so an employee's rows go to one job;
+# override with `device_mapping_shards` in site config to match the number of
+# `long` queue workers (e.g. `bench worker --queue long` started N times).
+DEFAULT_DEVICE_MAPPING_SHARDS = 4
+DEVICE_INSERT_FIELDS = (
+    "name", "owner", "creation", "modified", "modified_by", "docstatus",
+    "assigned_to_employee", "device_serial", "device_serial_2", "sim_serial",
+    "device_type", "device_name", "device_description", "facility", "health_department",
+)
 
 def enqueue_device_mapping():
-    offset = 0
     limit = 13000
     file_name = "device_mapping.csv"
-    file_path = frappe.utils.get_site_path("public", "files", file_name)
 
     try:
-        df = pd.read_csv(file_path, dtype=str).fillna("").applymap(lambda x: x.strip() if isinstance(x, str) else x)
-
-        # Remove invalid rows (where ID No. is missing or NIL)
-        df_valid = df[~df["ID No."].str.upper().isin(["", "NIL"])]
-
-        for i in range(0, len(df_valid), limit):
-            df_chunk = df_valid.iloc[i:i + limit]
+        shard_count = max(1, int(frappe.conf.get("device_mapping_shards") or DEFAULT_DEVICE_MAPPING_SHARDS))
 
+        # One job per shard, so every row of an ID No. is handled by one job and two
+        # workers never create the same Employee. Jobs carry only the file reference:
+        # each streams the file itself and keeps its own shard's rows
+        for shard in range(shard_count):
             frappe.enqueue(
-                "careverse_hq.api.device_mapping.process_uploaded_csv",
+                "careverse_hq.api.device_mapping.process_device_mapping_shard",
                 queue="long",
                 timeout=None,
                 is_async=True,
                 now=False,
-                **{"df_chunk": df_chunk.to_dict(orient="records")}  # Convert to list of dicts for easy processing
+                file_name=file_name,
+                shard=shard,
+                shard_count=shard_count,
+                chunk_size=limit
             )
 
     except Exception as e:
-        print(f"Error opening file: {e}")
+        print(f"Error enqueueing device mapping: {e}")
+
+
+def read_device_mapping_blocks(file_path, chunk_size):
+    """Stream the device mapping CSV in blocks, stripped and without rows missing an ID No."""
+    # Only the parsed block is held as a DataFrame.
+    # na_filter=False keeps empty cells as "" so no fillna copy is needed
+    for df in pd.read_csv(
+        file_path, dtype=str, na_filter=False, skipinitialspace=True, chunksize=chunk_size, engine="c"
+    ):
+        for col in df.columns:
+            df[col] = df[col].str.strip()
+
+        # Remove invalid rows (where ID No. is missing or NIL)
+        invalid_id_mask = df["ID No."].str.upper().isin(["", "NIL"])
+        yield df[~invalid_id_mask]
+
+
+def get_device_mapping_shard(id_no, shard_count):
+    """Deterministically map an ID No. to a shard in [0, shard_count)."""
+    return int(hashlib.md5(id_no.upper().encode()).hexdigest(), 16) % shard_count
 
+def log_device_mapping_debug(message):
+    """Per-row import logging, only when `device_mapping_debug` is set in site config."""
+    if frappe.conf.get("device_mapping_debug"):
+        frappe.logger("device_mapping").debug(message)
 
 def split_name(name):
     parts = name.split()
@@ -41,12 +77,25 @@ def split_name(name):
     else:
         return parts[0], parts[1], " ".join(parts[2:])
 
-def create_or_get_employee(row):
+def get_existing_employees(id_nos):
+    """Map identification number -> Employee name for the given ID numbers in one query."""
+    if not id_nos:
+        return {}
+
+    rows = frappe.db.sql("""
+        SELECT name, custom_identification_number
+        FROM `tabEmployee`
+        WHERE custom_identification_number IN %(ids)s
+    """, {"ids": tuple(id_nos)}, as_dict=True)
+
+    return {row.custom_identification_number: row.name for row in rows}
+
+def create_or_get_employee(row, existing_employees):
     id_no = row["ID No."]
-    employee = frappe.get_value("Employee", {"custom_identification_number": id_no}, "name")
+    employee = existing_employees.get(id_no)
     
     if employee:
-        print(f"Employee Found: {employee}")
+        log_device_mapping_debug(f"Employee Found: {employee}")
         return employee  
     
     first_name, middle_name, last_name = split_name(row["HEALTH WORKER NAME"])
@@ -70,18 +119,46 @@ def create_or_get_employee(row):
     })
     
     new_employee.insert(ignore_permissions=True)
-    frappe.db.commit()
-    print(f"New Employee Created: {first_name} {last_name}")
+    existing_employees[id_no] = new_employee.name
+    log_device_mapping_debug(f"New Employee Created: {first_name} {last_name}")
     
     return new_employee.name
 
-def create_health_device_record(row, employee_id):
+def get_existing_device_serials(serials):
+    """Return the subset of the given device serials that already have a Health Automation Device."""
+    if not serials:
+        return set()
+
+    return set(frappe.db.sql_list("""
+        SELECT device_serial
+        FROM `tabHealth Automation Device`
+        WHERE device_serial IN %(serials)s
+    """, {"serials": tuple(serials)}))
+
+def get_existing_departments(department_names):
+    """Return the subset of the given names that exist as Department records."""
+    if not department_names:
+        return set()
+
+    return set(frappe.db.sql_list("""
+        SELECT name
+        FROM `tabDepartment`
+        WHERE name IN %(names)s
+    """, {"names": tuple(department_names)}))
+
+def build_health_device_row(row, employee_id, existing_devices, departments):
+    """
+    Build the column values for a new Health Automation Device, or return None
+    if the device serial is already registered.
+
+    The rows are written with frappe.db.bulk_insert, so the name and standard
+    fields are set here the same way insert() would set them.
+    """
     imei_1 = row.get("IMEI 1", "")
 
-    existing_device = frappe.get_value("Health Automation Device", {"device_serial": imei_1})
-    if existing_device:
-        print(f"Skipping duplicate Health Device: {imei_1}")
-        return  
+    if imei_1 in existing_devices:
+        log_device_mapping_debug(f"Skipping duplicate Health Device: {imei_1}")
+        return None
     
     health_device = frappe.get_doc({
         "doctype": "Health Automation Device",
@@ -93,30 +170,83 @@ def create_health_device_record(row, employee_id):
         "device_name":"NEON TAB 11",
         "device_description": "NEON TAB 11",
         "facility": row.get("SUB-COUNTY", ""),
-        "health_department": row.get("FACILITY", ""),
+        # bulk_insert skips link validation, so only keep departments resolved up front
+        "health_department": facility if (facility := row.get("FACILITY", "")) in departments else "",
     })
-    
-    health_device.insert(ignore_permissions=True)
-    frappe.db.commit()
-    return
-    # print(f"Health Automation Device Record Created for Employee: {employee_id}")
+    health_device.docstatus = 0
+    health_device.set_new_name()
+    health_device.set_user_and_timestamp()
+
+    existing_devices.add(imei_1)
+    return tuple(health_device.get(field) for field in DEVICE_INSERT_FIELDS)
 
-def process_uploaded_csv(df_chunk):
+def process_uploaded_csv(csv_chunk):
+    process_device_mapping_rows(pd.read_csv(io.StringIO(csv_chunk), dtype=str, na_filter=False).to_dict(orient="records"))
+
+def process_device_mapping_rows(df_chunk):
+    """Create the employees and devices for one chunk of rows and commit them together."""
     try:
+        # Resolve all existing employees for this chunk in one query
+        id_nos = {row["ID No."] for row in df_chunk if row["ID No."].upper() not in ("", "NIL")}
+        existing_employees = get_existing_employees(id_nos)
+
         # First Pass: Create or Get Employees
         for row in df_chunk:
-            create_or_get_employee(row)  # Ensure all employees exist first
+            create_or_get_employee(row, existing_employees)  # Ensure all employees exist first
 
         print("Finished creating employees. Now processing device records...")
 
         # Second Pass: Query Employee Doctype and Create Device Records
+        existing_devices = get_existing_device_serials({row.get("IMEI 1") for row in df_chunk if row.get("IMEI 1")})
+        departments = get_existing_departments({row.get("FACILITY") for row in df_chunk if row.get("FACILITY")})
+        device_rows = []
         for row in df_chunk:
-            employee_id = frappe.get_value("Employee", {"custom_identification_number": row["ID No."]}, "name")
+            employee_id = existing_employees.get(row["ID No."])
 
             if employee_id:
-                create_health_device_record(row, employee_id)
+                device_row = build_health_device_row(row, employee_id, existing_devices, departments)
+                if device_row:
+                    device_rows.append(device_row)
             else:
-                print(f"Warning: No employee found for ID No. {row['ID No.']}")
+                log_device_mapping_debug(f"Warning: No employee found for ID No. {row['ID No.']}")
+
+        # Insert all device records for the chunk in batches
+        if device_rows:
+            frappe.db.bulk_insert(
+                "Health Automation Device",
+                DEVICE_INSERT_FIELDS,
+                device_rows,
+                chunk_size=DEVICE_INSERT_BATCH_SIZE,
+            )
+
+        # Commit employees and devices for the whole chunk at once
+        frappe.db.commit()
 
     except Exception as e:
-        print(f"Error in process_uploaded_csv: {str(e)}")
+        # Discard the partial chunk so it can be re-run cleanly
+        frappe.db.rollback()
+        print(f"Error in process_device_mapping_rows: {str(e)}")
+
+def process_device_mapping_shard(file_name, shard, shard_count, chunk_size):
+    """
+    Import one shard's rows of the device mapping file, in chunks of up to
+    chunk_size rows; each chunk is committed on its own. Only the current
+    block and the shard's pending rows are held in memory.
+    """
+    file_path = frappe.utils.get_site_path("public", "files", file_name)
+    pending = []
+    pending_rows = 0
+
+    for df in read_device_mapping_blocks(file_path, chunk_size):
+        df_shard = df[df["ID No."].map(lambda id_no: get_device_mapping_shard(id_no, shard_count)) == shard]
+        if df_shard.empty:
+            continue
+        pending.append(df_shard)
+        pending_rows += len(df_shard)
+        if pending_rows >= chunk_size:
+            process_device_mapping_rows(pd.concat(pending).to_dict(orient="records"))
+            pending = []
+            pending_rows = 0
+
+    if pending:
+        process_device_mapping_rows(pd.concat(pending).to_dict(orient="records"))
@@ -1,13 +1,123 @@
 import frappe
-from frappe import _
 import re
-from frappe.utils import escape_html, get_fullname ,strip_html_tags
-from .utils import api_response
-import json
+from frappe.utils import get_fullname
 from healthpro_erp.healthpro_erp.decorators.permissions import auth_required
-from .utils import sanitize_request,api_response
+from .utils import sanitize_request,api_response,get_cached_count,clear_cached_counts
 
 
+_TAG_RE = re.compile(r'<[^<]+?>')
+_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+COMMENTS_CACHE_TTL = 60
+COMMENT_NOTIFY_DEDUPE_TTL = 3600
+NOTIFY_RECIPIENTS_CACHE_TTL = 300
+# Roles every system user holds implicitly (not stored in Has Role)
+_AUTOMATIC_READ_ROLES = {"All", "Desk User"}
+
+
+def _comments_cache_prefix(document_type, doc_id):
+    return "comments_api:{}|{}|".format(document_type, doc_id)
+
+
+def _get_comment_page(document_type, doc_id, page, per_page, before_creation, before_name, with_total):
+    """Return (formatted_comments, pagination) for one page, cached briefly in Redis."""
+    cache_key = _comments_cache_prefix(document_type, doc_id) + "|".join(
+        str(v) for v in (page, per_page, before_creation, before_name, with_total)
+    )
+    cached = frappe.cache().get_value(cache_key)
+    if cached:
+        return cached
+
+    comment_filters = {
+        "reference_doctype": document_type,
+        "reference_name": doc_id,
+        "comment_type": "Comment"
+    }
+    
+    # Count only on request; has_more is enough to drive paging
+    total_count = get_cached_count("Comment", comment_filters) if with_total else None
+    
+    # Fetch one extra row to know whether another page exists
+    Comment = frappe.qb.DocType("Comment")
+    query = (
+        frappe.qb.from_(Comment)
+        .select(Comment.name, Comment.content, Comment.comment_by, Comment.creation, Comment.comment_email)
+        .where(Comment.reference_doctype == document_type)
+        .where(Comment.reference_name == doc_id)
+        .where(Comment.comment_type == "Comment")
+        .orderby(Comment.creation, order=frappe.qb.desc)
+        .orderby(Comment.name, order=frappe.qb.desc)
+        .limit(per_page + 1)
+    )
+    if before_creation:
+        # Seek past the cursor instead of scanning an offset
+        if before_name:
+            query = query.where(
+                (Comment.creation < before_creation)
+                | ((Comment.creation == before_creation) & (Comment.name < before_name))
+            )
+        else:
+            query = query.where(Comment.creation < before_creation)
+    else:
+        query = query.offset((page - 1) * per_page)
+    
+    comments = query.run(as_dict=True)
+    has_more = len(comments) > per_page
+    comments = comments[:per_page]
+    
+    next_cursor = None
+    if has_more:
+        next_cursor = {
+            "before_creation": str(comments[-1].creation),
+            "before_name": comments[-1].name
+        }
+    
+    # Resolve commenter names and designations in one query each
+    user_ids = {c.comment_by or c.comment_email for c in comments} - {None, ""}
+    commenter_ids = {c.comment_by for c in comments if c.comment_by}
+    name_map = {}
+    if user_ids:
+        name_map = {
+            u.name: u.full_name
+            for u in frappe.get_all("User", filters={"name": ["in", list(user_ids)]}, fields=["name", "full_name"])
+        }
+    desig_map = {}
+    if commenter_ids:
+        desig_map = {
+            e.user_id: e.designation
+            for e in frappe.get_all(
+                "Employee", filters={"user_id": ["in", list(commenter_ids)]}, fields=["user_id", "designation"]
+            )
+        }
+    
+    # Format the response to include user details
+    formatted_comments = []
+    for comment in comments:
+        comment_by = comment.get("comment_by")
+        comment_email = comment.get("comment_email")
+        user_id = comment_by or comment_email
+        
+        user_name = name_map.get(user_id) or user_id
+        
+        designation = desig_map.get(comment_by) or None
+        
+        plain_comment = _TAG_RE.sub('', comment.content or "")
+        
+        formatted_comments.append({
+            "comment": plain_comment,
+            "user": user_name,
+            "designation": designation,
+            "time": comment.creation.strftime(_TIMESTAMP_FORMAT)
+        })
+
+    pagination = {
+        "current_page": page,
+        "per_page": per_page,
+        "total_count": total_count,
+        "has_more": has_more,
+        "next_cursor": next_cursor
+    }
+    frappe.cache().set_value(cache_key, (formatted_comments, pagination), expires_in_sec=COMMENTS_CACHE_TTL)
+    return formatted_comments, pagination
 
 
 @frappe.whitelist(methods=["GET"])
@@ -24,6 +134,10 @@ def get_comments(**kwargs):
     # Pagination parameters
     page = int(kwargs.get("page", 1))
     per_page = int(kwargs.get("per_page", 10))
+    # Keyset cursor: creation/name of the last comment on the previous page
+    before_creation = kwargs.get("before_creation")
+    before_name = kwargs.get("before_name")
+    with_total = frappe.utils.cint(kwargs.get("with_total"))
     
     # Validate page and per_page
     if page < 1:
@@ -48,63 +162,10 @@ def get_comments(**kwargs):
         )
     
     try:
-        # Get total count first
-        total_count = frappe.db.count("Comment", filters={
-            "reference_doctype": document_type,
-            "reference_name": doc_id,
-            "comment_type": "Comment"
-        })
-        
-        # Calculate offset
-        offset = (page - 1) * per_page
-        
-        # Get paginated comments
-        comments = frappe.get_all("Comment",
-            filters={
-                "reference_doctype": document_type,
-                "reference_name": doc_id,
-                "comment_type": "Comment"
-            },
-            fields=[
-                "name",
-                "content",
-                "comment_by",
-                "creation",
-                "comment_email"
-            ],
-            order_by="creation desc",
-            limit_start=offset,
-            limit_page_length=per_page
+        formatted_comments, pagination = _get_comment_page(
+            document_type, doc_id, page, per_page, before_creation, before_name, with_total
         )
         
-        # Format the response to include user details
-        formatted_comments = []
-        for comment in comments:
-            comment_by = comment.get("comment_by")
-            comment_email = comment.get("comment_email")
-            user_name = None
-            user_id = comment_by or comment_email
-            
-            if user_id:
-                user_name = frappe.db.get_value("User", user_id, "full_name")
-            
-            if not user_name:
-                user_name = user_id
-            
-            designation = None
-            employee = frappe.db.get_value("Employee", {"user_id": comment.get("comment_by")}, "designation")
-            if employee:
-                designation = employee
-            
-            plain_comment = re.sub('<[^<]+?>', '', comment.content or "")
-            
-            formatted_comments.append({
-                "comment": plain_comment,
-                "user": user_name,
-                "designation": designation,
-                "time": comment.creation.strftime("%Y-%m-%d %H:%M:%S")
-            })
-        
         return api_response(
             success=True,
             message="Comments retrieved successfully",
@@ -113,11 +174,7 @@ def get_comments(**kwargs):
                 "document_id": doc_id,
                 "comments": formatted_comments
             },
-            pagination={
-                "current_page": page,
-                "per_page": per_page,
-                "total_count": total_count
-            },
+            pagination=pagination,
             status_code=200
         )
         
@@ -137,8 +194,9 @@ def get_comments(**kwargs):
 @auth_required()
 def add_comment(**kwargs):
  
+    # Frappe has already parsed the body (JSON included) into form_dict
     if not kwargs:
-        kwargs = frappe.local.request.get_json(silent=True)
+        kwargs = frappe.local.form_dict or frappe.local.request.get_json(silent=True) or {}
     
     document_type = kwargs.get("document_type")
     doc_id = kwargs.get("id")
@@ -149,19 +207,25 @@ def add_comment(**kwargs):
    
 
 
-    if not frappe.db.exists(document_type, doc_id):
+    # get_doc already fails for a missing document, so no separate exists() query
+    try:
+        doc = frappe.get_doc(document_type, doc_id)
+    except frappe.DoesNotExistError:
         return {"status": "Failed", "error": "Document not found"}
     
     try:
     
-        doc = frappe.get_doc(document_type, doc_id)
         comment = doc.add_comment("Comment", comment_text)
+        frappe.cache().delete_keys(_comments_cache_prefix(document_type, doc_id))
+        clear_cached_counts(comment)
         frappe.enqueue(
-            method="careverse_hq.api.new_device.send_email_notification",
+            method="careverse_hq.api.device_requests.send_email_notification",
             queue="short",
             timeout=60,
+            enqueue_after_commit=True,
             doc=doc,
-            comment_text=comment_text
+            comment_text=comment_text,
+            comment_name=comment.name
         )
         
       
@@ -174,10 +238,15 @@ def add_comment(**kwargs):
      
         return {"status": "Failed", "error": str(e)}
 
-def send_email_notification(doc, comment_text):
- 
+def send_email_notification(doc, comment_text, comment_name=None):
+    # Background job: recipient lookup and sending both run here, never in the request.
+    # A retried job for the same comment must not email everyone twice.
+    dedupe_key = None
+    if comment_name:
+        dedupe_key = frappe.cache().make_key(f"comment_notify:{comment_name}")
+        if not frappe.cache().set(dedupe_key, 1, ex=COMMENT_NOTIFY_DEDUPE_TTL, nx=True):
+            return
     
-   
     current_user = frappe.session.user
     commenter_name = get_fullname(current_user)
     
@@ -209,53 +278,81 @@ def send_email_notification(doc, comment_text):
         )
         print(f"Email sent to {len(recipients)} people")
     except Exception as e:
+        # Let a retry send it
+        if dedupe_key:
+            frappe.cache().delete(dedupe_key)
         frappe.log_error(str(e), "Email Send Error")
 
-def get_email_recipients(doc, exclude_user):
+def _get_read_roles(doctype):
+    """Roles with level-0 read access on the doctype (Custom DocPerm overrides DocPerm)."""
+    perm_doctype = "Custom DocPerm" if frappe.db.exists("Custom DocPerm", {"parent": doctype}) else "DocPerm"
+    return set(frappe.get_all(
+        perm_doctype,
+        filters={"parent": doctype, "read": 1, "permlevel": 0},
+        pluck="role"
+    ))
 
-    
-    usernames = []
-    
- 
-    all_users = frappe.get_all("User", 
-        filters={"enabled": 1, "user_type": "System User"}, 
-        fields=["name"]
-    )
-    
-    for user in all_users:
-        username = user.name
-        
-     
-        if username == exclude_user:
-            continue
-     
-        if frappe.has_permission(doc.doctype, "read", user=username):
-            usernames.append(username)
-    
- 
-    managers = frappe.get_all(
+def _get_notification_recipients(doctype):
+    """
+    (user, email) pairs to notify about comments on the doctype, cached in
+    Redis for NOTIFY_RECIPIENTS_CACHE_TTL seconds and cleared by
+    `clear_notification_recipients_cache` on role/permission changes.
+    """
+    cache_key = f"comment_notify_recipients:{doctype}"
+    recipients = frappe.cache().get_value(cache_key)
+    if recipients is not None:
+        return recipients
+    
+    # Users holding a role that can read the doctype, resolved in one query
+    read_roles = _get_read_roles(doctype)
+    readers = {"Administrator"}
+    if read_roles & _AUTOMATIC_READ_ROLES:
+        # Every system user can read it; these roles are implicit, not rows in Has Role
+        readers.update(frappe.get_all(
+            "User",
+            filters={"enabled": 1, "user_type": "System User"},
+            pluck="name"
+        ))
+    elif read_roles:
+        readers.update(frappe.get_all(
+            "Has Role",
+            filters={"role": ["in", list(read_roles)], "parenttype": "User"},
+            pluck="parent"
+        ))
+    
+    managers = set(frappe.get_all(
         "Has Role",
         filters={
             "role": ["in", ["System Manager", "Asset Manager"]],
-            "parent": ["!=", exclude_user]
+            "parenttype": "User"
         },
-        fields=["parent"]
-    )
-    
-    for manager in managers:
-        usernames.append(manager.parent)
+        pluck="parent"
+    ))
+    
+    # Readers must be enabled system users; managers are always notified
+    recipients = []
+    for user in frappe.get_all(
+        "User",
+        filters={"name": ["in", list(readers | managers)]},
+        fields=["name", "email", "enabled", "user_type"]
+    ):
+        if not user.email:
+            continue
+        if user.name in managers or (user.enabled and user.user_type == "System User"):
+            recipients.append((user.name, user.email))
     
+    frappe.cache().set_value(cache_key, recipients, expires_in_sec=NOTIFY_RECIPIENTS_CACHE_TTL)
+    return recipients
 
-    usernames = list(set(usernames))
-    
+def clear_notification_recipients_cache(doc, method=None):
+    """Drop cached comment recipients (doc_events hook on User / DocType / Custom DocPerm)."""
+    frappe.cache().delete_keys("comment_notify_recipients:")
 
-    email_addresses = []
-    for username in usernames:
-        user_email = frappe.db.get_value("User", username, "email")
-        if user_email:  
-            email_addresses.append(user_email)
-    
-    return email_addresses
+def get_email_recipients(doc, exclude_user):
+    # dict.fromkeys drops repeated addresses while keeping their order
+    return list(dict.fromkeys(
+        email for user, email in _get_notification_recipients(doc.doctype) if user != exclude_user
+    ))
 
 
 def send_email(document_type, doc_name, comment_text, commenter):
@@ -1,15 +1,25 @@
+import hashlib
 import frappe
 from frappe import _
 from frappe.utils import cint
+from frappe.query_builder import Case
+from frappe.query_builder.functions import Count, Sum
 from frappe.exceptions import ValidationError, PermissionError
 import json
 from typing import Any, Dict
 from .utils import api_response, sanitize_request
 from healthpro_erp.healthpro_erp.decorators.permissions import auth_required, AuthError
 
+REQUISITION_AGGREGATION_CACHE_TTL = 120  # seconds
 
 # ===== Helper Functions =====
 def _safe_int(value: Any, default: int = 0) -> int:
+    if value is None:
+        return default
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
     try:
         return int(value)
     except Exception:
@@ -34,12 +44,7 @@ def _read_query_params(kwargs: dict, expected_fields: list[str]) -> dict:
     Extract and normalize common query params from API kwargs
     by extracting expected fields.
     """
-    params = {}
-
-    for field in expected_fields:
-        params[field] = kwargs.get(field)
-
-    return params
+    return {field: kwargs.get(field) for field in expected_fields}
 
 def _validate_request_data(params: dict, required_fields: list[str] = None) -> None:
     """
@@ -53,6 +58,30 @@ def _validate_request_data(params: dict, required_fields: list[str] = None) -> N
         if not params.get(field):
             frappe.throw(f"Missing required field: {field}", frappe.ValidationError)
  
+def _get_cached_aggregation(kind, compute, filters, *args):
+    """
+    Return compute(filters, *args), cached in Redis per user and filter set.
+
+    Results are permission filtered, so the session user is part of the key.
+    Only call this from an @auth_required() function, so a cache hit is never
+    served before authentication has run. Entries are dropped by `clear_requisition_aggregation_cache` whenever a
+    Health Automation Device Request changes (see hooks.py).
+    """
+    digest = hashlib.md5(
+        json.dumps([filters, args], sort_keys=True, default=str).encode()
+    ).hexdigest()
+    key = "device_req_agg:{}:{}:{}".format(kind, frappe.session.user, digest)
+
+    result = frappe.cache().get_value(key)
+    if result is None:
+        result = compute(filters, *args)
+        frappe.cache().set_value(key, result, expires_in_sec=REQUISITION_AGGREGATION_CACHE_TTL)
+    return result
+
+def clear_requisition_aggregation_cache(doc, method=None):
+    """Drop cached requisition aggregations (doc_events hook)."""
+    frappe.cache().delete_keys("device_req_agg:")
+ 
 def _build_aggregation_filter(params, filter_for="subcounty"):
     filters = []
 
@@ -159,167 +188,145 @@ def _get_subcounty_aggregation(filters, start, page_size):
 
 # ===== Data Access Functions =====
 
+def _get_request_aggregation_query(fields, filters, group_by):
+    """
+    Base query on Health Automation Device Request with the caller's
+    permissions applied, grouped and ordered by `group_by`. Aggregate
+    columns are added by the caller with frappe.qb terms.
+    """
+    return frappe.qb.get_query(
+        "Health Automation Device Request",
+        fields=fields,
+        filters=filters,
+        group_by=group_by,
+        order_by=group_by,
+        ignore_permissions=False,
+    )
+
+def _status_count_columns(dr):
+    """SUM(CASE ...) columns counting approved / pending / rejected requests."""
+    return [
+        Sum(Case().when(dr.docstatus == docstatus, 1).else_(0)).as_(label)
+        for docstatus, label in ((1, "approved"), (0, "pending"), (2, "rejected"))
+    ]
+
 @auth_required()
 def _get_county_aggregation_v1(filters):
+    """Get county aggregation for the authenticated user, cached briefly."""
+    return _get_cached_aggregation("county", _compute_county_aggregation_v1, filters)
+
+def _compute_county_aggregation_v1(filters):
     """
-    Get county aggregation by fetching raw data and aggregating in Python.
-    Avoids SQL aggregate functions that are restricted in AWS RDS.
+    Compute county aggregation with COUNT / SUM(CASE ...) in SQL,
+    one row per county.
     """
-    from collections import defaultdict
+    dr = frappe.qb.DocType("Health Automation Device Request")
     
-    # Fetch raw data without complex SQL aggregations
-    raw_data = frappe.get_list(
-        "Health Automation Device Request",
-        filters=filters,
-        fields=[
-            "name",
-            "county",
-            "docstatus"
-        ],
-        order_by="county"
+    county_aggregation = (
+        _get_request_aggregation_query(["county as county_id", "county as county_name"], filters, "county")
+        .select(Count(dr.name).distinct().as_("total_requisitions"), *_status_count_columns(dr))
+        .run(as_dict=True)
     )
     
-    # Validate we have data with required fields
-    for row in raw_data:
-        if not row.get('county'):
+    for row in county_aggregation:
+        if not row.county_id:
             frappe.throw("County field is required but found empty/null value", frappe.ValidationError)
-    
-    # Aggregate in Python
-    county_map = defaultdict(lambda: {
-        "requisition_names": set(),
-        "approved": 0,
-        "pending": 0,
-        "rejected": 0
-    })
-    
-    for row in raw_data:
-        county = row['county']
-        county_map[county]['requisition_names'].add(row['name'])
-        
-        if row['docstatus'] == 1:
-            county_map[county]['approved'] += 1
-        elif row['docstatus'] == 0:
-            county_map[county]['pending'] += 1
-        elif row['docstatus'] == 2:
-            county_map[county]['rejected'] += 1
-    
-    # Convert to list format matching original structure
-    county_aggregation = []
-    for county, data in sorted(county_map.items()):
-        county_aggregation.append({
-            "county_id": county,
-            "county_name": county,
-            "total_requisitions": len(data['requisition_names']),
-            "approved": data['approved'],
-            "pending": data['pending'],
-            "rejected": data['rejected']
-        })
+        for field in ("total_requisitions", "approved", "pending", "rejected"):
+            row[field] = cint(row[field])
     
     return county_aggregation
 
 
 @auth_required()
-def _get_subcounty_aggregation_v1(filters, start, page_size):
+def _get_subcounty_aggregation_v1(filters, start, page_size, after_sub_county=None):
+    """Get a page of subcounty aggregation for the authenticated user, cached briefly."""
+    return _get_cached_aggregation(
+        "subcounty", _compute_subcounty_aggregation_v1, filters, start, page_size, after_sub_county
+    )
+
+def _compute_subcounty_aggregation_v1(filters, start, page_size, after_sub_county=None):
     """
-    Get subcounty aggregation by fetching raw data and aggregating in Python.
-    Avoids SQL aggregate functions that are restricted in AWS RDS.
+    Compute subcounty aggregation with COUNT / SUM(CASE ...) in SQL.
+    Only the requested page of sub-counties is grouped and fetched: with
+    `after_sub_county` the page continues after that sub-county
+    (WHERE sub_county > cursor, in the database's own ordering), otherwise
+    it starts at `start`. Totals and validation come from one aggregate
+    query over all matching requests.
     """
-    from collections import defaultdict
+    dr = frappe.qb.DocType("Health Automation Device Request")
+    
+    page_query = (
+        _get_request_aggregation_query(["sub_county as sub_county_id", "sub_county as sub_county_name"], filters, "sub_county")
+        .select(
+            Count(dr.name).distinct().as_("total_requisitions"),
+            Sum(dr.quantity).as_("total_devices_requested"),
+            Count(dr.health_facility).distinct().as_("requested_facilities"),
+            *_status_count_columns(dr),
+        )
+        # One extra row tells whether another page follows
+        .limit(page_size + 1)
+    )
+    if after_sub_county:
+        page_query = page_query.where(dr.sub_county > after_sub_county)
+    else:
+        page_query = page_query.offset(start)
+    sub_counties = page_query.run(as_dict=True)
+    has_more = len(sub_counties) > page_size
+    sub_counties = sub_counties[:page_size]
     
-    # Fetch raw data without complex SQL aggregations
-    raw_data = frappe.get_list(
+    # Totals and validation over all matching requests, on the same permission-aware query
+    matching = frappe.qb.get_query(
         "Health Automation Device Request",
+        fields=["name", "sub_county", "quantity"],
         filters=filters,
-        fields=[
-            "name",
-            "sub_county",
-            "quantity",
-            "health_facility",
-            "docstatus",
-            "device_requested"
-        ],
-        order_by="sub_county"
+        ignore_permissions=False,
     )
+    name, sub_county, quantity = (matching.field(field) for field in ("name", "sub_county", "quantity"))
+    summary_columns = [
+        Count(name).distinct().as_("total_requisitions"),
+        Count(sub_county).distinct().as_("total_sub_counties"),
+        Sum(Case().when(sub_county.isnull() | (sub_county == ""), 1).else_(0)).as_("missing_sub_county"),
+        Sum(Case().when(quantity.isnull(), 1).else_(0)).as_("missing_quantity"),
+    ]
+    if after_sub_county:
+        # Position of the cursor, so the page number can still be reported
+        summary_columns.append(
+            Count(Case().when(sub_county <= after_sub_county, sub_county)).distinct().as_("before_cursor")
+        )
+    summary = frappe.qb.from_(matching).select(*summary_columns).run(as_dict=True)[0]
     
-    # Validate required fields
-    for row in raw_data:
-        if not row.get('sub_county'):
-            frappe.throw("Sub-county field is required but found empty/null value", frappe.ValidationError)
-        if row.get('quantity') is None:
-            frappe.throw("Quantity field is required but found null value", frappe.ValidationError)
-        if not row.get('device_requested'):
-            frappe.throw("Device requested field is required but found empty/null value", frappe.ValidationError)
-    
-    # Aggregate by sub-county
-    subcounty_map = defaultdict(lambda: {
-        "requisition_names": set(),
-        "facilities": set(),
-        "total_quantity": 0,
-        "approved": 0,
-        "pending": 0,
-        "rejected": 0
-    })
-    
-    # Aggregate by device/item
-    items_map = defaultdict(int)
-    
-    # Track unique sub-counties
-    unique_subcounties = set()
-    
-    for row in raw_data:
-        sub_county = row['sub_county']
-        unique_subcounties.add(sub_county)
-        
-        # Sub-county aggregation
-        subcounty_map[sub_county]['requisition_names'].add(row['name'])
-        subcounty_map[sub_county]['facilities'].add(row['health_facility'])
-        subcounty_map[sub_county]['total_quantity'] += int(row.get('quantity', 0))
-        
-        if row['docstatus'] == 1:
-            subcounty_map[sub_county]['approved'] += 1
-        elif row['docstatus'] == 0:
-            subcounty_map[sub_county]['pending'] += 1
-        elif row['docstatus'] == 2:
-            subcounty_map[sub_county]['rejected'] += 1
-        
-        # Items aggregation
-        items_map[row['device_requested']] += int(row.get('quantity', 0))
+    items_summary = (
+        _get_request_aggregation_query(["device_requested as item_id", "device_requested as item_name"], filters, "device_requested")
+        .select(Sum(dr.quantity).as_("total_requested"))
+        .run(as_dict=True)
+    )
     
-    # Convert sub-county map to list format
-    subcounty_list = []
-    for sub_county, data in sorted(subcounty_map.items()):
-        subcounty_list.append({
-            "sub_county_id": sub_county,
-            "sub_county_name": sub_county,
-            "total_requisitions": len(data['requisition_names']),
-            "total_devices_requested": data['total_quantity'],
-            "requested_facilities": len(data['facilities']),
-            "approved": data['approved'],
-            "pending": data['pending'],
-            "rejected": data['rejected']
-        })
+    # Validate required fields
+    if cint(summary.missing_sub_county):
+        frappe.throw("Sub-county field is required but found empty/null value", frappe.ValidationError)
+    if cint(summary.missing_quantity):
+        frappe.throw("Quantity field is required but found null value", frappe.ValidationError)
     
-    # Apply pagination to sub-county list
-    total_subcounties = len(subcounty_list)
-    paginated_subcounties = subcounty_list[start:start + page_size]
+    for row in sub_counties:
+        for field in ("total_requisitions", "total_devices_requested", "requested_facilities", "approved", "pending", "rejected"):
+            row[field] = cint(row[field])
     
-    # Convert items map to list format
-    items_summary = []
-    for device, total_qty in sorted(items_map.items()):
-        items_summary.append({
-            "item_id": device,
-            "item_name": device,
-            "total_requested": total_qty
-        })
+    for item in items_summary:
+        if not item.item_id:
+            frappe.throw("Device requested field is required but found empty/null value", frappe.ValidationError)
+        item["total_requested"] = cint(item["total_requested"])
     
-    # Calculate totals
-    total_requisitions = len(raw_data)
+    if after_sub_county:
+        start = cint(summary.before_cursor)
     
     return {
-        "sub_counties": paginated_subcounties,
+        "sub_counties": sub_counties,
+        "next_after_sub_county": sub_counties[-1].sub_county_id if has_more else None,
+        # Offset the page actually starts at (differs from the request when a cursor is used)
+        "start": start,
         "items_summary": items_summary,
-        "total_requisitions": total_requisitions,
-        "total_sub_counties": total_subcounties
+        "total_requisitions": cint(summary.total_requisitions),
+        "total_sub_counties": cint(summary.total_sub_counties)
     }
 
 
@@ -338,6 +345,8 @@ def get_subcounty_requisition_aggregation(**kwargs):
         workflow_state (str): Optional filter for request workflow status.
         limit (int): Filter for pagination.
         page (int): Filter for pagination.
+        after_sub_county (str): Optional keyset cursor; returns the page after this sub-county
+            (use pagination.next_after_sub_county from the previous response).
     
     Returns:
         dict: Total requisitions, Total sub-counties, Summary by sub-county, Summary by item, Pagination
@@ -366,13 +375,19 @@ def get_subcounty_requisition_aggregation(**kwargs):
         }
     """
     try:
-        expected_data = ["from_date", "to_date", "status", "workflow_state", "county_id", "search", "limit", "page"]
+        expected_data = ["from_date", "to_date", "status", "workflow_state", "county_id", "search", "limit", "page", "after_sub_county"]
         
         request_data = _read_query_params(kwargs, expected_data)
         page_size, start = _build_pagination_params(request_data)
         subcounty_filters = _build_aggregation_filter(request_data)
         
-        aggregation_response = _get_subcounty_aggregation_v1(subcounty_filters, start, page_size)
+        aggregation_response = _get_subcounty_aggregation_v1(
+            subcounty_filters, start, page_size, request_data.get("after_sub_county")
+        )
+        pagination = _paginate(
+            aggregation_response.get("start"), page_size, aggregation_response.get("total_sub_counties")
+        )
+        pagination["next_after_sub_county"] = aggregation_response.get("next_after_sub_county")
         
         # Return Combined Result
         return api_response(
@@ -384,7 +399,7 @@ def get_subcounty_requisition_aggregation(**kwargs):
                 "total_sub_counties": aggregation_response.get("total_sub_counties")
             },
             status_code=200,
-            pagination=_paginate(start, page_size, aggregation_response.get("total_sub_counties"))
+            pagination=pagination
         )
 
 
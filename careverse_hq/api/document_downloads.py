@@ -6,6 +6,7 @@ import csv
 from healthpro_erp.healthpro_erp.decorators.permissions import auth_required
 from .utils import sanitize_request,api_response
 
+MAX_EXPORT_LIMIT = 10000
 
 
 
@@ -16,7 +17,7 @@ def export_facility_affiliations_csv(**kwargs):
     """
     Export Facility Affiliation records to CSV.
     Supports filters:
-    - ?limit=10 (number of records)
+    - ?limit=10 (number of records, capped at MAX_EXPORT_LIMIT)
     - ?order=asc|desc
     - ?name=<specific record ID>
     - ?affiliation_status=Active
@@ -27,7 +28,7 @@ def export_facility_affiliations_csv(**kwargs):
         frappe.throw(_("Not permitted"), frappe.PermissionError)
     
     # Params
-    limit = int(kwargs.get("limit", 100))
+    limit = max(1, min(MAX_EXPORT_LIMIT, int(kwargs.get("limit", 100))))
     order = kwargs.get("order", "desc").lower()
     facility_id = kwargs.get("facility_id")
     
@@ -35,17 +36,9 @@ def export_facility_affiliations_csv(**kwargs):
     reserved = {"limit", "order", "cmd", "facility_id"}
     filters = {k: v for k, v in kwargs.items() if k not in reserved}
     
-    # Add facility filter if provided
+    # Add facility filter if provided; an unknown facility simply matches
+    # no records and is reported by the empty-result path below
     if facility_id:
-        # Verify facility exists
-        if not frappe.db.exists("Health Facility", facility_id):
-
-            api_response(
-            success=False,
-            message= f"Facility '{facility_id}' not found",
-            status_code=404   )
-            return
-        
         filters["health_facility"] = facility_id
     
     # Fields from Facility Affiliation
@@ -86,28 +79,44 @@ def export_facility_affiliations_csv(**kwargs):
         )
         return
     
-    # Create CSV in memory
-    output = io.StringIO()
+    # Write CSV as UTF-8 straight into a byte buffer so no encoded copy is needed
+    buf = io.BytesIO()
+    output = io.TextIOWrapper(buf, encoding="utf-8", newline="")
     writer = csv.writer(output)
     
     # Write headers
     writer.writerow(headers)
     
+    # Look up linked facilities and professionals in one query each
+    facility_ids = {r.health_facility for r in records if r.health_facility}
+    professional_ids = {r.health_professional for r in records if r.health_professional}
+    
+    facilities = {}
+    if facility_ids:
+        facilities = {
+            f.name: f
+            for f in frappe.get_all(
+                "Health Facility",
+                filters={"name": ["in", list(facility_ids)]},
+                fields=["name", "facility_name", "kephl_level", "sub_county"]
+            )
+        }
+    
+    professionals = {}
+    if professional_ids:
+        professionals = {
+            p.name: p
+            for p in frappe.get_all(
+                "Health Professional",
+                filters={"name": ["in", list(professional_ids)]},
+                fields=["name", "first_name", "license_id"]
+            )
+        }
+    
     # Collect data rows
     for record in records:
-        facility = frappe.db.get_value(
-            "Health Facility",
-            record.get("health_facility"),
-            ["facility_name", "kephl_level", "sub_county"],
-            as_dict=True
-        ) or {}
-        
-        professional = frappe.db.get_value(
-            "Health Professional",
-            record.get("health_professional"),
-            ["first_name", "license_id"],
-            as_dict=True
-        ) or {}
+        facility = facilities.get(record.get("health_facility")) or {}
+        professional = professionals.get(record.get("health_professional")) or {}
         
         row = [
             professional.get("first_name") or "",
@@ -120,7 +129,8 @@ def export_facility_affiliations_csv(**kwargs):
         writer.writerow(row)
     
     # Get CSV content as bytes
-    csv_content = output.getvalue()
+    output.flush()
+    csv_content = buf.getvalue()
     output.close()
     
     # Filename with timestamp (include facility ID if specified)
@@ -131,7 +141,7 @@ def export_facility_affiliations_csv(**kwargs):
     
     # Stream file back
     frappe.local.response.filename = filename
-    frappe.local.response.filecontent = csv_content.encode('utf-8')
+    frappe.local.response.filecontent = csv_content
     frappe.local.response.type = "download"
     return
 
@@ -4,17 +4,27 @@ from werkzeug.utils import secure_filename
 from careverse_hq.api import utils
 
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "pdf", "csv", "xlsx", "docx","xls", "doc"}
+ALLOWED_SUFFIXES = tuple("." + ext for ext in ALLOWED_EXTENSIONS)
 MAX_FILE_SIZE_MB = 5 
+MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
 
 def is_file_allowed(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return filename.lower().endswith(ALLOWED_SUFFIXES)
 
 
-def is_file_size_allowed(file_stream):
+def _stream_size(file_stream):
     file_stream.seek(0, 2)  # Seek to end
     size = file_stream.tell()
     file_stream.seek(0)  # Reset to start
-    return size <= MAX_FILE_SIZE_MB * 1024 * 1024
+    return size
+
+
+def is_file_size_allowed(file_storage):
+    # The part's Content-Length is client-controlled: only trust it to reject early,
+    # and always measure the real stream before accepting the file
+    if file_storage.content_length and file_storage.content_length > MAX_FILE_SIZE_BYTES:
+        return False
+    return _stream_size(file_storage.stream) <= MAX_FILE_SIZE_BYTES
 
 @frappe.whitelist()
 @rate_limit(limit=10, seconds=60 * 5)
@@ -49,9 +59,10 @@ def upload_custom_document():
         response = utils.api_response(status_code=http_status_code,message=message)
         return response
 
+    # Validate every file before writing any, so a rejected file does not leave
+    # earlier Files saved without their Document Upload rows
     for filename in filenames:
         doc_obj = files[filename]
-        file_stream = doc_obj.stream
         id_filename = secure_filename(doc_obj.filename)
         
         if not is_file_allowed(id_filename):
@@ -60,14 +71,18 @@ def upload_custom_document():
             response = utils.api_response(status_code=http_status_code,message=message)
             return response
         
-        if not is_file_size_allowed(file_stream):
+        if not is_file_size_allowed(doc_obj):
             http_status_code = 400
             message = f"File {id_filename} exceeds size limit of {MAX_FILE_SIZE_MB}MB."
             response = utils.api_response(status_code=http_status_code,message=message)
             return response
+
+    for filename in filenames:
+        doc_obj = files[filename]
+        id_filename = secure_filename(doc_obj.filename)
         
-        file_stream.seek(0)
-        doc_content = file_stream.read()
+        # The size check leaves the stream at the start
+        doc_content = doc_obj.stream.read()
         
         id_ret = frappe.get_doc(
             {
@@ -81,25 +96,27 @@ def upload_custom_document():
         )
         id_ret.save()
 
-        _d = frappe.get_doc("File", id_ret.get("name"))
         args = dict(
             doctype="Document Upload",
             document_category=document_category,
             document_id=docname,
             document_type=filename,
             document_number=id_filename,
-            attachment=_d.get("file_url"),
+            attachment=id_ret.get("file_url"),
         )
         
+        # insert() keeps the controller, link and permission checks; the
+        # commit happens once after all files (at most 5)
         try:
             frappe.get_doc(args).insert()
-            frappe.db.commit()
         except frappe.PermissionError:
             frappe.db.rollback()
             http_status_code = 403
             message = "Not permitted to create Document Upload."
             response = utils.api_response(status_code=http_status_code,message=message)
             return response
+
+    frappe.db.commit()
         
     http_status_code = 200
     message = "Document upload was completed successfully."
@@ -8,8 +8,29 @@ All endpoints leverage Frappe's native User Permissions for Company-based access
 """
 
 import frappe
+from frappe.query_builder.functions import Count
 from typing import Optional
 from .response import api_response
+from .utils import CountOver
+
+EMPLOYEE_LIST_FIELDS = [
+    # Standard Employee fields
+    "name", "employee_name", "employee_number",
+    "first_name", "last_name", "middle_name",
+    "gender", "date_of_birth", "date_of_joining", "date_of_leaving",
+    "company", "department", "designation", "employment_type",
+    "status", "cell_number", "personal_email", "company_email",
+    "image",
+
+    # Custom fields
+    "custom_health_professional",
+    "custom_facility_id", "custom_facility_name",
+    "custom_identification_type", "custom_identification_number",
+    "custom_is_licensed_practitioner",
+
+    # System fields
+    "creation", "modified"
+]
 
 
 def _normalize_optional_string(value: Optional[str]) -> Optional[str]:
@@ -31,6 +52,32 @@ def _normalize_optional_string(value: Optional[str]) -> Optional[str]:
     return cleaned
 
 
+def _build_employee_list_query(filters: dict, search: Optional[str], fields: list):
+    """
+    Employee query with the caller's permissions (Company User Permissions)
+    applied, the given filters, and the search term OR-ed across name,
+    phone and email fields.
+    """
+    query = frappe.qb.get_query(
+        "Employee",
+        fields=fields,
+        filters=filters if filters else None,
+        ignore_permissions=False,
+    )
+
+    if search:
+        Employee = frappe.qb.DocType("Employee")
+        pattern = f"%{search}%"
+        query = query.where(
+            Employee.employee_name.like(pattern)
+            | Employee.cell_number.like(pattern)
+            | Employee.company_email.like(pattern)
+            | Employee.personal_email.like(pattern)
+        )
+
+    return query
+
+
 @frappe.whitelist()
 def get_employees(
     page: int = 1,
@@ -126,55 +173,27 @@ def get_employees(
 
             filters["custom_health_professional"] = ["in", hp_names]
 
-        # Search filter (OR conditions)
-        or_filters = None
-        if search:
-            or_filters = [
-                ["employee_name", "like", f"%{search}%"],
-                ["cell_number", "like", f"%{search}%"],
-                ["company_email", "like", f"%{search}%"],
-                ["personal_email", "like", f"%{search}%"]
-            ]
-
-        # Get total count with the same list API path to preserve permission behavior.
-        # Frappe count aggregations are inconsistent across versions in strict mode.
-        # Use a permission-aware name-only query and count rows in Python.
-        count_rows = frappe.get_list(
-            "Employee",
-            filters=filters if filters else None,
-            or_filters=or_filters,
-            fields=["name"],
-            page_length=0
+        # One permission-aware query returns the page and, via COUNT(*) OVER (),
+        # the total number of matching employees on every row.
+        employees = (
+            _build_employee_list_query(filters, search, EMPLOYEE_LIST_FIELDS)
+            .select(CountOver().over().as_("_total_count"))
+            .orderby(frappe.qb.DocType("Employee").employee_name)
+            .limit(page_size)
+            .offset((page - 1) * page_size)
+            .run(as_dict=True)
         )
-        total_count = len(count_rows)
 
-        # Query Employee with fields
-        employees = frappe.get_list(
-            "Employee",
-            filters=filters if filters else None,
-            or_filters=or_filters,
-            fields=[
-                # Standard Employee fields
-                "name", "employee_name", "employee_number",
-                "first_name", "last_name", "middle_name",
-                "gender", "date_of_birth", "date_of_joining", "date_of_leaving",
-                "company", "department", "designation", "employment_type",
-                "status", "cell_number", "personal_email", "company_email",
-                "image",
-
-                # Custom fields
-                "custom_health_professional",
-                "custom_facility_id", "custom_facility_name",
-                "custom_identification_type", "custom_identification_number",
-                "custom_is_licensed_practitioner",
-
-                # System fields
-                "creation", "modified"
-            ],
-            start=(page - 1) * page_size,
-            page_length=page_size,
-            order_by="employee_name asc"
-        )
+        if employees:
+            total_count = employees[0]["_total_count"]
+            for emp in employees:
+                emp.pop("_total_count", None)
+        elif page == 1:
+            total_count = 0
+        else:
+            # Past the last page there are no rows to carry the total; count separately
+            matching = _build_employee_list_query(filters, search, ["name"])
+            total_count = frappe.qb.from_(matching).select(Count("*")).run()[0][0]
 
         # Deduplicate: if multiple employees are linked to the same Health Professional,
         # keep only the most recent one
@@ -3,7 +3,15 @@ API utilities for CareVerse HQ
 """
 
 import frappe
+import functools
+import hashlib
+import json
 import math
+from frappe.query_builder.functions import Count
+from pypika.terms import AnalyticFunction, Star
+from healthpro_erp.healthpro_erp.decorators.permissions import AuthError
+
+LIST_COUNT_CACHE_TTL = 60  # seconds
 
 
 def api_response(
@@ -17,7 +25,8 @@ def api_response(
         data (Any): Data to return on success
         message (str): Error message or success message
         status_code (int): HTTP status code
-        pagination (dict): Pagination metadata
+        pagination (dict): Pagination metadata; total_count may be None when
+            the total was not computed, and any extra keys are returned as-is
 
     Returns:
         None: Sets frappe.local.response with standardized format
@@ -39,14 +48,19 @@ def api_response(
         response_data["message"] = message
 
     if pagination:
+        total_count = pagination.get("total_count")
         response_data["pagination"] = {
+            # Extra keys (e.g. keyset cursors, has_more) are passed through as-is
+            **pagination,
             "current_page": pagination["current_page"],
             "per_page": pagination["per_page"],
-            "total_count": pagination["total_count"],
-            "total_pages": math.ceil(
-                pagination["total_count"] / int(pagination["per_page"])
-            )
-            or 1,
+            "total_count": total_count,
+            # Endpoints may skip counting; there is no page total then
+            "total_pages": (
+                math.ceil(total_count / int(pagination["per_page"])) or 1
+                if total_count is not None
+                else None
+            ),
         }
 
     frappe.local.response.update(response_data)
@@ -55,3 +69,133 @@ def api_response(
     if not frappe.conf.get("developer_mode") or frappe.conf.get("developer_mode") == 0:
         frappe.clear_messages()
         frappe.local.response.pop("_server_messages", None)
+
+
+class CountOver(AnalyticFunction):
+    """COUNT(*) window function; use as CountOver().over() for the full result size."""
+
+    def __init__(self, alias=None):
+        super().__init__("COUNT", Star(), alias=alias)
+
+
+def get_list_page_with_total(doctype, filters, fields, order_by, start, page_size):
+    """
+    Return one page of a permission-aware list together with the total number
+    of matching records, read from the same query via COUNT(*) OVER ().
+
+    Built with frappe.qb.get_query(ignore_permissions=False), so the same
+    permission conditions as frappe.get_list apply to both rows and total.
+
+    Args:
+        doctype (str): DocType to list
+        filters (list | dict): Filters as accepted by frappe.get_list
+        fields (list): Fields to select (aliases allowed)
+        order_by (str): Order clause, e.g. "creation desc"
+        start (int): Offset of the page
+        page_size (int): Number of rows in the page
+
+    Returns:
+        tuple: (rows, total_count)
+    """
+    rows = (
+        frappe.qb.get_query(
+            doctype, fields=fields, filters=filters, order_by=order_by, ignore_permissions=False
+        )
+        .select(CountOver().over().as_("_total_count"))
+        .limit(page_size)
+        .offset(start)
+        .run(as_dict=True)
+    )
+
+    if rows:
+        total_count = rows[0]["_total_count"]
+        for row in rows:
+            row.pop("_total_count", None)
+    elif not start:
+        total_count = 0
+    else:
+        # Past the last page there are no rows to carry the total; count separately
+        matching = frappe.qb.get_query(doctype, fields=["name"], filters=filters, ignore_permissions=False)
+        total_count = frappe.qb.from_(matching).select(Count("*")).run()[0][0]
+
+    return rows, total_count
+
+
+def get_cached_count(doctype, filters, ttl=LIST_COUNT_CACHE_TTL):
+    """
+    Return frappe.db.count for the given filters, cached briefly in Redis so
+    paginating through a list does not re-count on every page.
+
+    Cached counts for a doctype are cleared by `clear_cached_counts` when its
+    records change (called directly or as a doc_events hook).
+
+    Args:
+        doctype (str): DocType to count
+        filters (list | dict): Filters passed to frappe.db.count
+        ttl (int): Cache lifetime in seconds
+
+    Returns:
+        int: Number of matching records
+    """
+    digest = hashlib.md5(
+        json.dumps(filters, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    key = "list_count:{}:{}".format(doctype, digest)
+
+    count = frappe.cache().get_value(key)
+    if count is None:
+        count = frappe.db.count(doctype, filters=filters)
+        frappe.cache().set_value(key, count, expires_in_sec=ttl)
+    return count
+
+
+def clear_cached_counts(doc, method=None):
+    """Drop cached list counts for the document's doctype (usable as a doc_events hook)."""
+    frappe.cache().delete_keys("list_count:{}:".format(doc.doctype))
+
+
+def api_errors(log_title, failure_message, log_validation_errors=True, format_validation_error=None):
+    """
+    Decorator that maps the standard API exceptions to api_response() calls,
+    so whitelisted endpoints only contain their success path.
+
+    Place it below @frappe.whitelist so the whitelisted function is the wrapper.
+
+    Args:
+        log_title (str): Error Log title for logged failures
+        failure_message (str): Message returned for unexpected (500) errors
+        log_validation_errors (bool): Also log ValidationErrors to the Error Log
+        format_validation_error (callable): Optional ve -> message formatter
+
+    Returns:
+        callable: Decorator
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                return fn(*args, **kwargs)
+
+            except frappe.PermissionError as pe:
+                frappe.db.rollback()
+                return api_response(success=False, message=str(pe), status_code=403)
+
+            except frappe.ValidationError as ve:
+                frappe.db.rollback()
+                if log_validation_errors:
+                    frappe.log_error(frappe.get_traceback(), log_title)
+                message = format_validation_error(ve) if format_validation_error else str(ve)
+                return api_response(success=False, message=message, status_code=400)
+
+            except AuthError as ae:
+                return api_response(success=False, message=ae.message, status_code=ae.status_code)
+
+            except Exception:
+                frappe.db.rollback()
+                frappe.log_error(frappe.get_traceback(), log_title)
+                return api_response(success=False, message=failure_message, status_code=500)
+
+        return wrapper
+
+    return decorator
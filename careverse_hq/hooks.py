@@ -135,13 +135,32 @@ home_page = "index"
 # ---------------
 # Hook on document methods and events
 
-# doc_events = {
-# 	"*": {
-# 		"on_update": "method",
-# 		"on_cancel": "method",
-# 		"on_trash": "method"
-# 	}
-# }
+_clear_requisition_aggregations = "careverse_hq.api.device_requisitions.clear_requisition_aggregation_cache"
+
+doc_events = {
+	"Health Automation Device Request": {
+		event: _clear_requisition_aggregations
+		for event in ("after_insert", "on_update", "on_submit", "on_update_after_submit", "on_cancel", "on_trash")
+	}
+}
+
+# Delivery note details include PO-wide delivered totals and attachments
+_clear_delivery_note_details = "careverse_hq.api.delivery_note.clear_delivery_note_detail_cache"
+
+for _doctype in ("Purchase Receipt", "File", "Document Upload"):
+	doc_events[_doctype] = {
+		event: _clear_delivery_note_details
+		for event in ("after_insert", "on_update", "on_submit", "on_update_after_submit", "on_cancel", "on_trash")
+	}
+
+# Has Role and DocPerm are child tables, so listen on their parents
+_clear_notification_recipients = "careverse_hq.api.device_requests.clear_notification_recipients_cache"
+
+for _doctype in ("User", "DocType", "Custom DocPerm"):
+	doc_events[_doctype] = {
+		"on_update": _clear_notification_recipients,
+		"on_trash": _clear_notification_recipients,
+	}
 
 # Scheduled Tasks
 # ---------------
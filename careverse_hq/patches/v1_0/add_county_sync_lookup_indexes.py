@@ -0,0 +1,14 @@
+"""
+Add indexes on the columns the county/sub-county sync looks records up by
+(Company.company_name, Company.abbr, Healthcare Organization.organization_name,
+Healthcare Organization Region.region_name).
+"""
+
+import frappe
+
+
+def execute():
+    frappe.db.add_index("Company", ["company_name"])
+    frappe.db.add_index("Company", ["abbr"])
+    frappe.db.add_index("Healthcare Organization", ["organization_name"])
+    frappe.db.add_index("Healthcare Organization Region", ["region_name"])
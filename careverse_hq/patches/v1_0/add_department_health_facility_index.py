@@ -0,0 +1,10 @@
+"""
+Index Department.custom_health_facility, which the department APIs use to
+resolve the Department that represents a Health Facility.
+"""
+
+import frappe
+
+
+def execute():
+    frappe.db.add_index("Department", ["custom_health_facility"])
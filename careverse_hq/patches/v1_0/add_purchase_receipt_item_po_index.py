@@ -0,0 +1,19 @@
+"""
+Index Purchase Receipt Item.purchase_order, which the delivery note APIs use
+to look up receipts (and delivered quantities) for a Purchase Order.
+"""
+
+import frappe
+from frappe.custom.doctype.property_setter.property_setter import make_property_setter
+
+
+def execute():
+    make_property_setter(
+        "Purchase Receipt Item",
+        "purchase_order",
+        "search_index",
+        1,
+        "Check",
+        validate_fields_for_doctype=False,
+    )
+    frappe.db.add_index("Purchase Receipt Item", ["purchase_order"])
@@ -0,0 +1,40 @@
+import frappe
+from frappe.tests import UnitTestCase
+
+from careverse_hq.api.utils import api_response
+
+
+class TestAPIResponsePagination(UnitTestCase):
+	def setUp(self):
+		frappe.local.response = frappe._dict()
+
+	def test_default_get_comments_pagination(self):
+		# get_comments without with_total: no count, keyset cursor instead
+		api_response(
+			success=True,
+			data={"comments": []},
+			pagination={
+				"current_page": 1,
+				"per_page": 10,
+				"total_count": None,
+				"has_more": True,
+				"next_cursor": {"before_creation": "2025-01-01 10:00:00", "before_name": "abc"},
+			},
+		)
+
+		pagination = frappe.local.response.pagination
+		self.assertIsNone(pagination["total_count"])
+		self.assertIsNone(pagination["total_pages"])
+		self.assertTrue(pagination["has_more"])
+		self.assertEqual(pagination["next_cursor"]["before_name"], "abc")
+
+	def test_total_pages_from_count(self):
+		api_response(
+			success=True,
+			data=[],
+			pagination={"current_page": 2, "per_page": 10, "total_count": 25, "next_after_sub_county": "Kabete"},
+		)
+
+		pagination = frappe.local.response.pagination
+		self.assertEqual(pagination["total_pages"], 3)
+		self.assertEqual(pagination["next_after_sub_county"], "Kabete")